@@ -1,48 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import sqlite3
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import webbrowser
-from matplotlib.ticker import MaxNLocator
-import ast
-import json
 from tkinter import font as tkfont
-import matplotlib.patches as mpatches
-from matplotlib import animation
 import time
-from PIL import Image, ImageTk
+import os
+import importlib
 
+import db
+from theme import theme
+import importer
+import exporter
+import profiling
+from tasks import TaskRunner
+from cache import LRUCache
+from search import CityIndex
 
-# Цветовая палитра
-class SmoothTheme:
-    def __init__(self):
-        self.colors = {
-            "bg": "#2a2a2e",
-            "panel": "#3a3a3f",
-            "accent": "#5a7bb5",
-            "text": "#e0e0e0",
-            "text_secondary": "#b0b0b0",
-            "entry_bg": "#4a4a4f",
-            "border": "#5a5a5f",
-            "graph_bg": "#2a2a2e",
-            "graph_grid": "#4a4a4f",
-            "button": "#4a4a4f",
-            "button_hover": "#5a5a5f",
-            "danger": "#9b4a4a",
-            "success": "#4a9b6a",
-            "highlight": "#3a4a6a",
-            "tooltip_bg": "#3a3a3f",
-            "tooltip_text": "#e0e0e0",
-            "card_bg": "#3a3a3f",
-            "card_border": "#5a5a5f"
-        }
-
-
-theme = SmoothTheme()
 
 # Шрифты
 FONT = ("Segoe UI", 10)
@@ -126,6 +98,10 @@ class SmoothButton(tk.Canvas):
 
         update_step()
 
+    def set_text(self, text):
+        self.text = text
+        self.draw_button()
+
     def on_enter(self, event=None):
         self.animate_color(self.bg_color, self.hover_color)
 
@@ -165,21 +141,236 @@ class InfoCard(tk.Frame):
         if new_unit and hasattr(self, 'unit_label'):
             self.unit_label.config(text=new_unit)
 
+    def update_title(self, new_title):
+        self.title_label.config(text=new_title)
+
+
+# Подсказки обновляются не чаще частоты кадров экрана (~60 Гц)
+HOVER_INTERVAL_MS = 16
+
+
+# Прореживание событий движения мыши: из пачки событий за интервал обрабатывается последнее
+class HoverThrottle:
+    def __init__(self, widget, callback, interval=HOVER_INTERVAL_MS):
+        self.widget = widget
+        self.callback = callback
+        self.interval = interval
+        self.event = None
+        self.after_id = None
+
+    def __call__(self, event):
+        self.event = event
+        if self.after_id is None:
+            self.after_id = self.widget.after(self.interval, self.fire)
+
+    def fire(self):
+        self.after_id = None
+        self.callback(self.event)
+
+    def cancel(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+
+
+# Подсказка меняется, только если изменился текст: лишняя установка вызывает перекомпоновку
+def set_hover_text(variable, text):
+    if variable.get() != text:
+        variable.set(text)
+
+
+# Модификаторы в event.state
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+
+# Виртуальный список городов: рисуются только видимые строки,
+# названия берутся из источника окнами по мере прокрутки
+class CityListbox(tk.Canvas):
+    def __init__(self, master=None, yscrollcommand=None, **kwargs):
+        super().__init__(master, bg=theme.colors["panel"], highlightthickness=0, bd=0,
+                         takefocus=1, **kwargs)
+        self.font = tkfont.Font(font=FONT)
+        self.row_height = self.font.metrics("linespace") + 4
+        self.yscrollcommand = yscrollcommand
+        self.source = ListSource([])
+        self.top = 0
+        self.selection = set()
+        self.anchor = None
+        self._rows = []
+
+        self.bind("<Configure>", lambda e: self.redraw())
+        self.bind("<Button-1>", self.on_click)
+        self.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.bind("<Button-5>", lambda e: self.scroll(3))
+        self.bind("<Up>", lambda e: self.move_selection(-1))
+        self.bind("<Down>", lambda e: self.move_selection(1))
+        self.bind("<Prior>", lambda e: self.move_selection(-self.full_rows))
+        self.bind("<Next>", lambda e: self.move_selection(self.full_rows))
+        self.bind("<Home>", lambda e: self.select(0))
+        self.bind("<End>", lambda e: self.select(len(self.source) - 1))
+
+    @property
+    def full_rows(self):
+        return max(1, self.winfo_height() // self.row_height)
+
+    @property
+    def visible_rows(self):
+        return self.full_rows + 1
+
+    def set_source(self, source):
+        self.source = source
+        self.top = 0
+        self.selection = set()
+        self.anchor = None
+        self.redraw()
+
+    def curselection(self):
+        return tuple(sorted(self.selection))
+
+    def get(self, index):
+        return self.source.get(index)
+
+    # Перерисовка видимых строк: элементы холста создаются один раз и переиспользуются
+    def redraw(self):
+        count = self.visible_rows
+        width = self.winfo_width()
+        while len(self._rows) < count:
+            y = len(self._rows) * self.row_height
+            background = self.create_rectangle(0, y, width, y + self.row_height, width=0)
+            text = self.create_text(8, y + self.row_height / 2, anchor="w", font=self.font)
+            self._rows.append((background, text))
+
+        names = self.source.window(self.top, self.top + count)
+        for i, (background, text) in enumerate(self._rows):
+            if i >= len(names):
+                self.itemconfigure(background, state="hidden")
+                self.itemconfigure(text, state="hidden")
+                continue
+            selected = self.top + i in self.selection
+            y = i * self.row_height
+            self.coords(background, 0, y, width, y + self.row_height)
+            self.itemconfigure(background, state="normal",
+                               fill=theme.colors["accent"] if selected else theme.colors["panel"])
+            self.itemconfigure(text, state="normal", text=names[i],
+                               fill="white" if selected else theme.colors["text"])
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        if not self.yscrollcommand:
+            return
+        total = len(self.source)
+        if total == 0:
+            self.yscrollcommand(0.0, 1.0)
+        else:
+            self.yscrollcommand(self.top / total, min(1.0, (self.top + self.full_rows) / total))
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.source) - self.full_rows))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+
+    def scroll(self, rows):
+        self.scroll_to(self.top + rows)
+
+    # Интерфейс прокрутки для tk.Scrollbar
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.source)))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.scroll(step * self.full_rows if args[2] == "pages" else step)
+
+    def select(self, index):
+        if not 0 <= index < len(self.source):
+            return
+        self.selection = {index}
+        self.anchor = index
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.full_rows:
+            self.top = index - self.full_rows + 1
+        self.redraw()
+        self.event_generate("<<ListboxSelect>>")
+
+    def move_selection(self, delta):
+        current = max(self.selection) if self.selection else -1
+        self.select(max(0, min(current + delta, len(self.source) - 1)))
+
+    # Ctrl+щелчок добавляет или убирает город из выбора, Shift+щелчок выбирает диапазон
+    def on_click(self, event):
+        self.focus_set()
+        index = self.top + event.y // self.row_height
+        if not 0 <= index < len(self.source):
+            return
+        if event.state & SHIFT_MASK and self.anchor is not None:
+            self.selection = set(range(min(self.anchor, index), max(self.anchor, index) + 1))
+        elif event.state & CONTROL_MASK:
+            self.selection ^= {index}
+            self.anchor = index
+        else:
+            self.select(index)
+            return
+        self.redraw()
+        self.event_generate("<<ListboxSelect>>")
 
-# Список городов с плавной прокруткой
-class CityListbox(tk.Listbox):
-    def __init__(self, master=None, **kwargs):
-        super().__init__(master, **kwargs)
-        self.config(
-            font=FONT,
-            selectbackground=theme.colors["accent"],
-            selectforeground="white",
-            bd=0,
-            highlightthickness=0,
-            bg=theme.colors["panel"],
-            fg=theme.colors["text"],
-            activestyle="none"
-        )
+
+# Источник строк для списка из готового списка (результаты поиска)
+class ListSource:
+    def __init__(self, items):
+        self.items = items
+
+    def __len__(self):
+        return len(self.items)
+
+    def window(self, start, stop):
+        return self.items[start:stop]
+
+    def get(self, index):
+        return self.items[index]
+
+
+# Источник строк из базы данных: страницы названий подгружаются при прокрутке.
+# Страница рядом с уже загруженной читается по ключу (время не зависит от позиции в списке),
+# OFFSET — только при переходе в далёкое место списка.
+class DatabaseCitySource:
+    PAGE_SIZE = 200
+
+    def __init__(self):
+        self.count = db.count_cities()
+        self._pages = LRUCache(64)
+        # Первое и последнее название загруженных страниц (остаются после вытеснения из кэша)
+        self._bounds = {}
+
+    def __len__(self):
+        return self.count
+
+    def _page(self, page):
+        names = self._pages.get(page)
+        if names is None:
+            if page - 1 in self._bounds:
+                names = db.get_cities_after(self._bounds[page - 1][1], self.PAGE_SIZE)
+            elif page + 1 in self._bounds:
+                names = db.get_cities_before(self._bounds[page + 1][0], self.PAGE_SIZE)
+            else:
+                names = db.get_cities_window(page * self.PAGE_SIZE, self.PAGE_SIZE)
+            self._pages.put(page, names)
+            if names:
+                self._bounds[page] = (names[0], names[-1])
+        return names
+
+    def window(self, start, stop):
+        stop = min(stop, self.count)
+        names = []
+        for page in range(start // self.PAGE_SIZE, (stop - 1) // self.PAGE_SIZE + 1):
+            offset = page * self.PAGE_SIZE
+            names.extend(self._page(page)[max(start - offset, 0):stop - offset])
+        return names
+
+    def get(self, index):
+        return self._page(index // self.PAGE_SIZE)[index % self.PAGE_SIZE]
 
 
 # Анимация загрузки
@@ -209,73 +400,75 @@ class LoadingAnimation(tk.Canvas):
             self.after_cancel(self.animation_id)
         self.delete("all")
 
+    def destroy(self):
+        if self.animation_id:
+            self.after_cancel(self.animation_id)
+            self.animation_id = None
+        super().destroy()
+
+
+# Окно прогресса длительной операции
+class ProgressDialog(tk.Toplevel):
+    def __init__(self, master=None, title="", text="", on_cancel=None, **kwargs):
+        super().__init__(master, bg=theme.colors["bg"], **kwargs)
+        self.title(title)
+        self.geometry("360x150" if on_cancel else "360x110")
+        self.resizable(False, False)
+        self.transient(master)
+
+        self.label = tk.Label(self, text=text, bg=theme.colors["bg"],
+                              fg=theme.colors["text"], font=FONT)
+        self.label.pack(pady=(15, 5))
+
+        self.bar = ttk.Progressbar(self, length=300, mode="determinate", maximum=100)
+        self.bar.pack(pady=5)
+
+        if on_cancel:
+            SmoothButton(self, text="Отмена", width=100, command=on_cancel).pack(pady=5)
+            self.protocol("WM_DELETE_WINDOW", on_cancel)
+
+    def set_progress(self, fraction, text=None):
+        self.bar["value"] = fraction * 100
+        if text:
+            self.label.config(text=text)
+        self.update_idletasks()
+
 
 # Функции для работы с базой данных
 def create_database():
-    conn = sqlite3.connect("real_estate.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS prices (
-            city TEXT,
-            year INTEGER,
-            average_price REAL,
-            description TEXT,
-            wiki_link TEXT,
-            PRIMARY KEY (city, year)
-        )
-    """)
-    conn.commit()
-    conn.close()
+    db.create_database()
 
 
 def get_cities():
-    conn = sqlite3.connect("real_estate.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT city FROM prices ORDER BY city")
-    cities = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return cities
+    return db.get_cities()
 
 
 def get_city_data(city):
-    conn = sqlite3.connect("real_estate.db")
-    query = "SELECT year, average_price, description, wiki_link FROM prices WHERE city = ? ORDER BY year"
-    df = pd.read_sql_query(query, conn, params=(city,))
-    conn.close()
-    return df
+    return db.get_city_data(city)
 
 
 def get_city_info(city):
-    conn = sqlite3.connect("real_estate.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT description, wiki_link FROM prices WHERE city = ? LIMIT 1", (city,))
-    city_info = cursor.fetchone()
-    conn.close()
-    return city_info if city_info else ("Описание отсутствует", "")
+    return db.get_city_info(city)
+
+
+# Запись из главного потока ждёт блокировку записи не дольше этого (с): фоновый импорт держит её
+# на время записи пачек, и вместо зависания окна показывается сообщение о занятой базе
+UI_WRITE_TIMEOUT = 2.0
 
 
 def add_city_to_db(city, prices, description, wiki_link):
-    conn = sqlite3.connect("real_estate.db")
-    cursor = conn.cursor()
-    for year, price in prices:
-        cursor.execute("""
-            INSERT OR REPLACE INTO prices (city, year, average_price, description, wiki_link)
-            VALUES (?, ?, ?, ?, ?)
-        """, (city, year, price, description, wiki_link))
-    conn.commit()
-    conn.close()
+    db.add_city(city, prices, description, wiki_link, timeout=UI_WRITE_TIMEOUT)
     messagebox.showinfo("Успех", f"Город {city} успешно добавлен в базу данных.")
 
 
 def delete_city_from_db(city):
     try:
-        conn = sqlite3.connect("real_estate.db")
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM prices WHERE city = ?", (city,))
-        conn.commit()
-        conn.close()
+        db.delete_city(city, timeout=UI_WRITE_TIMEOUT)
         messagebox.showinfo("Успех", f"Город {city} успешно удален из базы данных.")
         return True
+    except db.DatabaseBusy as e:
+        messagebox.showwarning("База данных занята", str(e))
+        return False
     except Exception as e:
         messagebox.showerror("Ошибка", f"Не удалось удалить город: {str(e)}")
         return False
@@ -289,6 +482,69 @@ def open_wiki(url):
 
 
 # Функции для работы с файлами
+def format_city_names(cities, limit=10):
+    names = sorted(cities)
+    text = ", ".join(names[:limit])
+    if len(names) > limit:
+        text += f" и ещё {len(names) - limit}"
+    return text
+
+
+# Период обновления окна прогресса импорта и экспорта, мс
+PROGRESS_POLL_MS = 100
+
+
+# Прогресс импорта для окна: задача пишет состояние, главный поток его опрашивает
+def import_progress(token, state):
+    def on_progress(records, bytes_read, total_bytes):
+        token.check()
+        state["records"], state["bytes_read"], state["total_bytes"] = records, bytes_read, total_bytes
+
+    return on_progress
+
+
+def run_import_file(token, file_path, state):
+    return importer.import_file(file_path, progress=import_progress(token, state))
+
+
+# Импорт идёт в фоне: fn(token, *args, state) выполняется в пуле задач,
+# окно прогресса позволяет отменить загрузку
+def start_import(fn, *args, on_done, on_error):
+    state = {"records": 0, "bytes_read": 0, "total_bytes": 0}
+    poll_id = None
+
+    def close():
+        if poll_id is not None:
+            root.after_cancel(poll_id)
+        progress_dialog.destroy()
+        # Часть пачек могла быть записана до ошибки или отмены
+        update_city_list()
+
+    def poll():
+        nonlocal poll_id
+        total = state["total_bytes"]
+        progress_dialog.set_progress(state["bytes_read"] / total if total else 0,
+                                     f"Загружено записей: {state['records']:,}")
+        poll_id = root.after(PROGRESS_POLL_MS, poll)
+
+    def on_cancel():
+        file_task_runner.cancel("import")
+        close()
+
+    def done(result):
+        close()
+        on_done(result)
+
+    def error(e):
+        close()
+        on_error(e)
+
+    progress_dialog = ProgressDialog(root, title="Импорт данных", text="Загрузка данных...",
+                                     on_cancel=on_cancel)
+    poll()
+    file_task_runner.submit(fn, *args, state, on_done=done, on_error=error, key="import")
+
+
 def load_from_txt():
     file_path = filedialog.askopenfilename(
         title="Выберите файл с данными",
@@ -296,331 +552,723 @@ def load_from_txt():
     if not file_path:
         return
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            try:
-                data = ast.literal_eval(content)
-                if not isinstance(data, list):
-                    raise ValueError("Файл должен содержать список кортежей")
-            except (SyntaxError, ValueError) as e:
-                messagebox.showerror("Ошибка", f"Неверный формат файла: {str(e)}")
-                return
+    def on_done(result):
+        messagebox.showinfo("Успех", f"Данные для городов {format_city_names(result.cities)} успешно загружены!")
 
-            conn = sqlite3.connect("real_estate.db")
-            cursor = conn.cursor()
-            added_cities = set()
-
-            for record in data:
-                if len(record) != 5:
-                    messagebox.showerror("Ошибка",
-                                         "Каждая запись должна содержать 5 элементов: город, год, цена, описание, ссылка")
-                    conn.close()
-                    return
-
-                city, year, price, description, wiki_link = record
-                cursor.execute("""
-                    INSERT OR REPLACE INTO prices (city, year, average_price, description, wiki_link)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (city, year, price, description, wiki_link))
-                added_cities.add(city)
-
-            conn.commit()
-            conn.close()
-            messagebox.showinfo("Успех", f"Данные для городов {', '.join(added_cities)} успешно загружены!")
-            update_city_list()
+    def on_error(e):
+        if isinstance(e, (SyntaxError, ValueError)):
+            messagebox.showerror("Ошибка", f"Неверный формат файла: {str(e)}")
+        else:
+            messagebox.showerror("Ошибка", f"Произошла ошибка при загрузке файла: {str(e)}")
 
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Произошла ошибка при загрузке файла: {str(e)}")
+    start_import(run_import_file, file_path, on_done=on_done, on_error=on_error)
 
 
-def export_to_txt():
+def run_export(token, file_path, state):
+    def on_progress(records, total):
+        token.check()
+        state["records"], state["total"] = records, total
+
+    return exporter.export_file(file_path, progress=on_progress)
+
+
+# Экспорт идёт в фоне: запись потоковая, окно прогресса позволяет отменить выгрузку
+def export_data(title, filetypes, defaultextension):
     file_path = filedialog.asksaveasfilename(
-        defaultextension=".txt",
-        filetypes=[("Text files", "*.txt")],
-        title="Сохранить как TXT")
+        defaultextension=defaultextension,
+        filetypes=filetypes,
+        title=title)
     if not file_path:
         return
     try:
-        conn = sqlite3.connect("real_estate.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT city, year, average_price, description, wiki_link FROM prices")
-        data = cursor.fetchall()
-        conn.close()
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(str(data))
-        messagebox.showinfo("Успех", "Данные успешно выгружены в TXT")
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {str(e)}")
+        exporter.format_for_path(file_path)
+    except ValueError as e:
+        messagebox.showerror("Ошибка", str(e))
+        return
+
+    state = {"records": 0, "total": 0}
+    poll_id = None
+
+    def close():
+        if poll_id is not None:
+            root.after_cancel(poll_id)
+        progress_dialog.destroy()
+
+    def poll():
+        nonlocal poll_id
+        total = state["total"]
+        progress_dialog.set_progress(state["records"] / total if total else 0,
+                                     f"Выгружено записей: {state['records']:,} из {total:,}")
+        poll_id = root.after(PROGRESS_POLL_MS, poll)
+
+    def on_cancel():
+        file_task_runner.cancel("export")
+        close()
+
+    def on_done(result):
+        close()
+        messagebox.showinfo("Успех", f"Выгружено записей: {result.records:,}")
+
+    def on_error(error):
+        close()
+        messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {str(error)}")
+
+    progress_dialog = ProgressDialog(root, title="Экспорт данных", text="Выгрузка данных...",
+                                     on_cancel=on_cancel)
+    poll()
+    file_task_runner.submit(run_export, file_path, state,
+                       on_done=on_done, on_error=on_error, key="export")
+
+
+def export_to_txt():
+    export_data("Сохранить как TXT", [("Text files", "*.txt")], ".txt")
 
 
 def export_to_json():
-    file_path = filedialog.asksaveasfilename(
-        defaultextension=".json",
-        filetypes=[("JSON files", "*.json")],
-        title="Сохранить как JSON")
-    if not file_path:
-        return
-    try:
-        conn = sqlite3.connect("real_estate.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT city, year, average_price, description, wiki_link FROM prices")
-        data = cursor.fetchall()
-        conn.close()
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        messagebox.showinfo("Успех", "Данные успешно выгружены в JSON")
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {str(e)}")
+    export_data("Сохранить как JSON",
+                [("JSON files", "*.json"), ("NDJSON files", "*.ndjson *.jsonl")], ".json")
+
+
+def export_to_table():
+    export_data("Сохранить таблицу",
+                [("CSV files", "*.csv"), ("Parquet files", "*.parquet")], ".csv")
 
 
 def load_from_json():
     file_path = filedialog.askopenfilename(
         title="Выберите JSON-файл",
-        filetypes=[("JSON файлы", "*.json")])
+        filetypes=[("JSON файлы", "*.json *.ndjson *.jsonl")])
     if not file_path:
         return
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        if not isinstance(data, list):
-            raise ValueError("Файл должен содержать список записей")
-        conn = sqlite3.connect("real_estate.db")
-        cursor = conn.cursor()
-        added_cities = set()
-        for record in data:
-            if len(record) != 5:
-                raise ValueError("Каждая запись должна содержать 5 элементов")
-            city, year, price, description, wiki_link = record
-            cursor.execute("""
-                INSERT OR REPLACE INTO prices (city, year, average_price, description, wiki_link)
-                VALUES (?, ?, ?, ?, ?)
-            """, (city, year, price, description, wiki_link))
-            added_cities.add(city)
-        conn.commit()
-        conn.close()
-        update_city_list()
-        messagebox.showinfo("Успех", f"Данные успешно загружены для городов: {', '.join(added_cities)}")
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Ошибка загрузки JSON: {str(e)}")
+    start_import(
+        run_import_file, file_path,
+        on_done=lambda result: messagebox.showinfo(
+            "Успех", f"Данные успешно загружены для городов: {format_city_names(result.cities)}"),
+        on_error=lambda e: messagebox.showerror("Ошибка", f"Ошибка загрузки JSON: {str(e)}"))
+
+
+# Импорт нескольких файлов: разбор в процессах, запись в базу — в фоновом потоке
+def run_import_files(token, paths, state):
+    # Регулярные выгрузки в основном повторяют базу: пишутся только новые и изменившиеся цены
+    return importer.import_files(paths, progress=import_progress(token, state), diff=True)
+
+
+def import_many(paths):
+    start_import(run_import_files, paths, on_done=show_import_summary,
+                 on_error=lambda e: messagebox.showerror("Ошибка", f"Ошибка импорта: {str(e)}"))
+
+
+def load_many_files():
+    paths = filedialog.askopenfilenames(
+        title="Выберите файлы с данными",
+        filetypes=(("Файлы данных", "*.txt *.json *.ndjson *.jsonl *.csv"), ("Все файлы", "*.*")))
+    if paths:
+        import_many(list(paths))
+
+
+def load_from_folder():
+    folder = filedialog.askdirectory(title="Выберите папку с данными")
+    if folder:
+        import_many([folder])
+
+
+# Итоги импорта по файлам: записи, новые города, отклонённые записи и ошибка разбора
+def show_import_summary(results):
+    window = tk.Toplevel(root, bg=theme.colors["bg"])
+    window.title("Итоги импорта")
+    window.geometry("900x520")
+    window.transient(root)
+
+    headings = {
+        "file": ("Файл", 260),
+        "records": ("Записей", 90),
+        "new_cities": ("Новых городов", 110),
+        "new": ("Новых цен", 90),
+        "updated": ("Изменено", 90),
+        "unchanged": ("Без изменений", 110),
+        "rejected": ("Отклонено", 90),
+        "status": ("Статус", 120),
+    }
+    configure_table_style(window)
+    table = ttk.Treeview(window, columns=tuple(headings), show="headings", style=TABLE_STYLE,
+                         height=min(len(results), 10))
+    for column, (title, width) in headings.items():
+        table.heading(column, text=title)
+        table.column(column, width=width, anchor="w" if column in ("file", "status") else "e",
+                     stretch=column == "file")
+    for result in results:
+        table.insert("", tk.END, values=(
+            os.path.basename(result.path), f"{result.records:,}", f"{len(result.new_cities):,}",
+            f"{result.new:,}", f"{result.updated:,}", f"{result.unchanged:,}",
+            f"{result.rejected.count:,}", "ошибка разбора" if result.error else "загружен"))
+    table.pack(fill=tk.X, padx=10, pady=10)
+
+    details = []
+    for result in results:
+        lines = []
+        if result.new_cities:
+            lines.append(f"Новые города: {format_city_names(result.new_cities)}")
+        if result.error:
+            lines.append(f"Ошибка: {result.error}")
+        lines.extend(result.rejected.messages)
+        hidden = result.rejected.count - len(result.rejected.messages)
+        if hidden:
+            lines.append(f"... и ещё отклонено записей: {hidden:,}")
+        if lines:
+            details.append("\n".join([result.path] + [f"  {line}" for line in lines]))
+
+    text_widget = tk.Text(window, font=FONT_SMALL, wrap=tk.WORD,
+                          bg=theme.colors["entry_bg"], fg=theme.colors["text"])
+    text_widget.insert(tk.END, "\n\n".join(details) or "Все записи загружены без ошибок")
+    text_widget.config(state="disabled")
+    text_widget.pack(fill=tk.BOTH, expand=True, padx=10)
+
+    SmoothButton(window, text="Закрыть", command=window.destroy).pack(pady=10)
 
 
 # Графики и прогнозы
-def plot_forecast(city):
-    try:
-        # Очищаем предыдущий график
-        for widget in frame_graph.winfo_children():
-            widget.destroy()
+# Интервал между кадрами анимации графика, мс
+ANIMATION_INTERVAL = 50
+
+# Кэш результатов прогноза по (город, версия данных города, горизонт, модель)
+FORECAST_CACHE_SIZE = 256
+forecast_cache = LRUCache(FORECAST_CACHE_SIZE)
+
+# Горизонт прогноза в интерфейсе, лет после последнего наблюдения
+DEFAULT_HORIZON = 1
+MAX_HORIZON = 30
+
+# Модели прогноза (ключи forecasting.MODELS) и их названия в интерфейсе
+MODEL_TITLES = {
+    "linear": "Линейный тренд",
+    "loglinear": "Логлинейный (CAGR)",
+    "holt": "Хольт",
+    "robust": "Устойчивый (Хьюбер)",
+}
+DEFAULT_MODEL = "linear"
+
+# Сколько городов можно сравнивать на одном графике
+MAX_COMPARE_CITIES = 20
+# Высота таблицы рейтинга в строках
+RANKING_ROWS = 8
+
+
+# Тяжёлые библиотеки загружаются при первом построении графика
+# или заранее в фоне, когда окно уже на экране
+HEAVY_MODULES = ("numpy", "forecasting", "charts", "matplotlib.backends.backend_tkagg")
+PRELOAD_DELAY_MS = 300
+
+
+def preload_heavy_modules(token):
+    for name in HEAVY_MODULES:
+        token.check()
+        importlib.import_module(name)
+
+
+# Расчёт прогноза в фоновом потоке: только данные, без обращений к Tk
+def compute_forecast(token, city, horizon, model):
+    from forecasting import city_forecast
+
+    # Версию берём до чтения данных: запись после этого момента сменит ключ
+    cache_key = (city, db.data_version(city), horizon, model)
+    cached = forecast_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    with profiling.span("forecast.sql"):
+        rows = db.get_city_data(city)
+    if not rows:
+        return None
+    token.check()
+
+    with profiling.span(f"forecast.fit.{model}"):
+        result = city_forecast(rows, horizon, model)
+    token.check()
+
+    with profiling.span("forecast.city_info"):
+        result["description"], result["wiki_url"] = get_city_info(city)
+    forecast_cache.put(cache_key, result)
+    return result
+
+
+# Данные сравнения городов в фоне: цены всех городов одним запросом, модель — одной пакетной
+# подгонкой, CAGR — из готовой сводки city_stats. Стоимость почти не зависит от числа городов.
+def compute_comparison(token, cities, horizon, model):
+    from forecasting import compare_forecast
+
+    with profiling.span("comparison.sql"):
+        rows = db.get_cities_data(cities)
+    if not rows:
+        return None
+    token.check()
+
+    with profiling.span(f"comparison.fit.{model}"):
+        result = compare_forecast(rows, horizon, model)
+    with profiling.span("comparison.stats"):
+        result["stats"] = {row[0]: row for row in db.get_city_stats(cities)}
+    return result
+
+
+# Подписи серий графика прогноза в подсказке
+SCENARIO_SUFFIXES = {
+    "trend": "",
+    "optimistic": " (оптимистичный)",
+    "pessimistic": " (пессимистичный)",
+}
+
+
+# Панель прогноза: фигура, холст, карточки и кнопки создаются один раз,
+# при выборе города обновляются только данные
+class ForecastView(tk.Frame):
+    def __init__(self, master=None, **kwargs):
+        from charts import FORECAST_COLORS, ForecastChart
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        super().__init__(master, bg=theme.colors["bg"], **kwargs)
+        self.city = None
+        self.horizon = None
+        self.model = None
+        self.wiki_url = ""
+        self.frame = 0
+        self.animation_id = None
+        self.animation_start = 0
+        self.animating = False
+        self.background = None
+        self.chart = ForecastChart()
 
-        # Показываем анимацию загрузки
-        loading = LoadingAnimation(frame_graph, size=80, color=theme.colors["accent"])
-        loading.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
-        frame_graph.update()
+        # Информационное окно
+        self.info_text = tk.StringVar()
+        info_frame = tk.Frame(self, bg=theme.colors["tooltip_bg"], padx=10, pady=5)
+        info_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
 
-        df = get_city_data(city)
-        if df.empty:
-            messagebox.showerror("Ошибка", f"Нет данных для города {city}")
-            loading.stop_animation()
-            loading.destroy()
+        tk.Label(info_frame, textvariable=self.info_text, bg=theme.colors["tooltip_bg"],
+                 fg=theme.colors["tooltip_text"], font=FONT_SMALL).pack()
+
+        # Карточки с информацией
+        stats_frame = tk.Frame(self, bg=theme.colors["bg"])
+        stats_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        self.current_price_card = InfoCard(stats_frame, title="Текущая цена", unit="₽/м²",
+                                           color=theme.colors["accent"])
+        self.forecast_card = InfoCard(stats_frame, title="Прогноз", unit="₽/м²",
+                                      color=FORECAST_COLORS["trend"])
+        self.optimistic_card = InfoCard(stats_frame, title="Оптимистичный", unit="₽/м²",
+                                        color=FORECAST_COLORS["optimistic"])
+        self.pessimistic_card = InfoCard(stats_frame, title="Пессимистичный", unit="₽/м²",
+                                         color=FORECAST_COLORS["pessimistic"])
+        for card in (self.current_price_card, self.forecast_card, self.optimistic_card, self.pessimistic_card):
+            card.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+
+        # График
+        self.canvas = FigureCanvasTkAgg(self.chart.figure, master=self)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.hover = HoverThrottle(self, self.on_motion)
+        self.canvas.mpl_connect('motion_notify_event', self.hover)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+        # Описание города
+        desc_frame = tk.Frame(self, bg=theme.colors["bg"])
+        desc_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        self.description_label = tk.Label(desc_frame, wraplength=700, justify=tk.LEFT,
+                                          bg=theme.colors["bg"], fg=theme.colors["text_secondary"], font=FONT)
+        self.description_label.pack(side=tk.LEFT)
+
+        # Кнопки управления
+        btn_frame = tk.Frame(self, bg=theme.colors["bg"])
+        btn_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+
+        self.wiki_button = SmoothButton(btn_frame, text="Википедия", width=100,
+                                        command=lambda: open_wiki(self.wiki_url))
+        self.bar_chart_button = SmoothButton(btn_frame, text="Диаграмма", width=100,
+                                             command=lambda: show_bar_chart(self.city))
+        self.bar_chart_button.pack(side=tk.LEFT, padx=5)
+
+        SmoothButton(btn_frame, text="Удалить", width=100, bg_color=theme.colors["danger"],
+                     hover_color="#ab4a4a", command=lambda: confirm_delete_city(self.city)).pack(side=tk.RIGHT, padx=5)
+
+    def show(self, city, forecast, animate=True):
+        from charts import format_price
+
+        self.stop_animation()
+        self.city = city
+        self.horizon = len(forecast["forecast_years"])
+        self.model = forecast["model"]
+        self.wiki_url = forecast["wiki_url"]
+        self.info_text.set("Наведите курсор на точки графика для информации")
+
+        self.current_price_card.update_title(f"Цена в {forecast['years'][-1]}")
+        self.current_price_card.update_value(f"{forecast['prices'][-1]:,.0f}")
+        self.forecast_card.update_title(f"Прогноз на {forecast['forecast_year']}")
+        self.forecast_card.update_value(format_price(forecast['predicted_price'], ",.0f"))
+        level = f"{forecast['level']:.0%}"
+        self.optimistic_card.update_title(f"Оптимистичный ({level})")
+        self.optimistic_card.update_value(format_price(forecast['optimistic_price'], ",.0f"))
+        self.pessimistic_card.update_title(f"Пессимистичный ({level})")
+        self.pessimistic_card.update_value(format_price(forecast['pessimistic_price'], ",.0f"))
+
+        self.description_label.config(text=forecast["description"])
+        if self.wiki_url:
+            self.wiki_button.pack(side=tk.LEFT, padx=5, before=self.bar_chart_button)
+        else:
+            self.wiki_button.pack_forget()
+
+        with profiling.span("chart.update"):
+            self.chart.update(city, forecast)
+        if animate:
+            self.start_animation()
+        else:
+            with profiling.span("chart.draw"):
+                self.canvas.draw()
+
+    # Анимированное построение графика с блиттингом: статичная часть (оси, сетка, легенда)
+    # рисуется один раз, в каждом кадре поверх сохранённого фона рисуются только линии
+    def start_animation(self):
+        self.stop_animation()
+        self.animating = True
+        self.chart.set_animated(True)
+        self.chart.draw_frame(0)
+        with profiling.span("chart.draw"):
+            self.canvas.draw()
+        self.frame = 0
+        self.animation_start = time.perf_counter()
+        self.animation_id = self.after(ANIMATION_INTERVAL, self.next_frame)
+
+    def next_frame(self):
+        # Номер кадра считается по времени: при задержках кадры пропускаются, темп не падает
+        elapsed = (time.perf_counter() - self.animation_start) * 1000
+        frame = min(int(elapsed // ANIMATION_INTERVAL), self.chart.frame_count - 1)
+        if frame != self.frame:
+            self.frame = frame
+            self.chart.draw_frame(frame)
+            self.blit()
+
+        if frame < self.chart.frame_count - 1:
+            delay = ANIMATION_INTERVAL - int(elapsed % ANIMATION_INTERVAL)
+            self.animation_id = self.after(max(1, delay), self.next_frame)
+        else:
+            self.animation_id = None
+            self.stop_animation()
+            self.canvas.draw_idle()
+
+    def blit(self):
+        if self.background is None:
+            return
+        with profiling.span("chart.blit"):
+            self.canvas.restore_region(self.background)
+            self.chart.draw_animated()
+            self.canvas.blit(self.chart.ax.bbox)
+
+    # Полная перерисовка (в том числе при изменении размера окна) обновляет фон для блиттинга
+    def on_draw(self, event):
+        if not self.animating:
             return
+        self.background = self.canvas.copy_from_bbox(self.chart.ax.bbox)
+        self.chart.draw_animated()
 
-        X = df["year"].values.reshape(-1, 1)
-        y = df["average_price"].values
+    def stop_animation(self):
+        if self.animation_id:
+            self.after_cancel(self.animation_id)
+            self.animation_id = None
+        if self.animating:
+            self.animating = False
+            self.background = None
+            self.chart.set_animated(False)
+            self.chart.show_all()
+
+    def destroy(self):
+        self.stop_animation()
+        self.hover.cancel()
+        super().destroy()
+
+    # Подсказка по ближайшей к курсору точке; во время анимации линии показаны не полностью
+    def on_motion(self, event):
+        if self.animating or event.inaxes != self.chart.ax:
+            return
+        hit = self.chart.points.nearest(self.chart.ax, event)
+        if hit is None:
+            return
+        series, year, price = hit
+        if series == "historical":
+            text = f"{self.city}, {int(year)} год: {price:.0f} ₽/м²"
+        elif year > self.chart.years[-1]:
+            text = f"Прогноз {self.city}, {int(year)} год{SCENARIO_SUFFIXES[series]}: {price:.0f} ₽/м²"
+        else:
+            text = f"{self.city}, {int(year)} год, модель{SCENARIO_SUFFIXES[series]}: {price:.0f} ₽/м²"
+        set_hover_text(self.info_text, text)
 
-        model = LinearRegression()
-        model.fit(X, y)
 
-        optimistic_model = LinearRegression()
-        optimistic_model.fit(X, y * 1.15)
+# Оформление таблиц (ttk.Treeview) в цветах темы
+TABLE_STYLE = "Table.Treeview"
 
-        pessimistic_model = LinearRegression()
-        pessimistic_model.fit(X, y * 0.85)
 
-        year_to_predict = np.array([[2025]])
-        predicted_price = model.predict(year_to_predict)
-        optimistic_price = optimistic_model.predict(year_to_predict)
-        pessimistic_price = pessimistic_model.predict(year_to_predict)
+def configure_table_style(widget):
+    style = ttk.Style(widget)
+    style.configure(TABLE_STYLE, background=theme.colors["panel"],
+                    fieldbackground=theme.colors["panel"], foreground=theme.colors["text"], font=FONT)
+    style.configure(f"{TABLE_STYLE}.Heading", font=FONT_BOLD)
+    style.map(TABLE_STYLE, background=[("selected", theme.colors["accent"])])
 
-        # Создаем фигуру
-        fig = plt.figure(figsize=(8, 5), dpi=100, facecolor=theme.colors["graph_bg"])
-        ax = fig.add_subplot(111, facecolor=theme.colors["graph_bg"])
 
-        # Цвета для графиков
-        colors = {
-            "historical": theme.colors["accent"],
-            "trend": "#6fa54a",
-            "optimistic": "#a56f4a",
-            "pessimistic": "#a54a6f"
-        }
+# Панель сравнения городов: общий график и таблица рейтинга по темпам роста.
+# Двойной щелчок по строке открывает прогноз города, щелчок по заголовку — сортировка.
+class ComparisonView(tk.Frame):
+    COLUMNS = ("rank", "city", "last_price", "cagr", "forecast", "change")
 
-        # Информационное окно
-        info_text = tk.StringVar()
-        info_text.set("Наведите курсор на точки графика для информации")
+    def __init__(self, master=None, **kwargs):
+        from charts import ComparisonChart
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        super().__init__(master, bg=theme.colors["bg"], **kwargs)
+        self.cities = []
+        self.horizon = None
+        self.model = None
+        self.rows = []
+        self.sort_column = "cagr"
+        self.sort_descending = True
+        self.chart = ComparisonChart()
+        self.chart.figure.subplots_adjust(bottom=0.3)
 
-        info_frame = tk.Frame(frame_graph, bg=theme.colors["tooltip_bg"], padx=10, pady=5)
+        # Информационное окно
+        self.info_text = tk.StringVar()
+        info_frame = tk.Frame(self, bg=theme.colors["tooltip_bg"], padx=10, pady=5)
         info_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
 
-        tk.Label(info_frame, textvariable=info_text, bg=theme.colors["tooltip_bg"],
+        tk.Label(info_frame, textvariable=self.info_text, bg=theme.colors["tooltip_bg"],
                  fg=theme.colors["tooltip_text"], font=FONT_SMALL).pack()
 
-        # Создаем карточки с информацией
-        stats_frame = tk.Frame(frame_graph, bg=theme.colors["bg"])
-        stats_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        # Таблица рейтинга
+        configure_table_style(self)
+        table_frame = tk.Frame(self, bg=theme.colors["bg"])
+        table_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+        self.table = ttk.Treeview(table_frame, columns=self.COLUMNS, show="headings",
+                                  height=RANKING_ROWS, style=TABLE_STYLE)
+        headings = {
+            "rank": ("№", 40),
+            "city": ("Город", 200),
+            "last_price": ("Текущая цена, ₽/м²", 150),
+            "cagr": ("Рост в год (CAGR), %", 150),
+            "forecast": ("Прогноз, ₽/м²", 130),
+            "change": ("Изменение, %", 110),
+        }
+        for column, (title, width) in headings.items():
+            self.table.heading(column, text=title, command=lambda c=column: self.sort_by(c))
+            self.table.column(column, width=width, anchor="w" if column == "city" else "e",
+                              stretch=column == "city")
+        table_scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.table.yview)
+        self.table.configure(yscrollcommand=table_scrollbar.set)
+        table_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.table.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.table.bind("<Double-1>", self.on_row_open)
+
+        # График
+        self.canvas = FigureCanvasTkAgg(self.chart.figure, master=self)
+        self.canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.hover = HoverThrottle(self, self.on_motion)
+        self.canvas.mpl_connect('motion_notify_event', self.hover)
+
+    def show(self, cities, comparison, total=None):
+        from charts import format_price
+
+        self.cities = list(cities)
+        self.horizon = comparison["forecast_years"].shape[1]
+        self.model = comparison["model"]
+        if total is not None and total > len(cities):
+            self.info_text.set(f"Показаны первые {len(cities)} из {total} выбранных городов")
+        else:
+            self.info_text.set("Наведите курсор на линии графика для информации")
+
+        stats = comparison["stats"]
+        self.rows = []
+        for i, city in enumerate(comparison["names"]):
+            cagr = stats[city][8] if city in stats else None
+            self.rows.append({
+                "city": city,
+                "last_price": comparison["last_prices"][i],
+                "cagr": float("nan") if cagr is None else cagr * 100,
+                "forecast": comparison["forecast_prices"][i, -1],
+                "change": comparison["change"][i] * 100,
+                "text": (city, f"{comparison['last_prices'][i]:,.0f}",
+                         "—" if cagr is None else f"{cagr * 100:.2f}",
+                         format_price(comparison["forecast_prices"][i, -1], ",.0f"),
+                         format_price(comparison["change"][i] * 100, ".2f")),
+            })
+        self.table.heading("forecast", text=f"Прогноз на {comparison['forecast_year']}, ₽/м²")
+        self.fill_table()
+
+        with profiling.span("comparison.chart_update"):
+            self.chart.update(comparison)
+        with profiling.span("comparison.draw"):
+            self.canvas.draw()
+
+    # Строки без значения (NaN) всегда в конце рейтинга
+    def fill_table(self):
+        column = self.sort_column
+        missing = [row for row in self.rows if row[column] != row[column]]
+        present = [row for row in self.rows if row[column] == row[column]]
+        present.sort(key=lambda row: row[column], reverse=self.sort_descending)
+        self.table.delete(*self.table.get_children())
+        for rank, row in enumerate(present + missing, 1):
+            self.table.insert("", tk.END, iid=row["city"], values=(rank,) + row["text"])
+
+    def sort_by(self, column):
+        if column == "rank":
+            return
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = column != "city"
+        self.fill_table()
 
-        # Карточка с текущей ценой
-        last_price = y[-1]
-        current_price_card = InfoCard(stats_frame, title="Текущая цена",
-                                      value=f"{last_price:,.0f}", unit="₽/м²",
-                                      color=theme.colors["accent"])
-        current_price_card.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-
-        # Карточка с прогнозом
-        forecast_card = InfoCard(stats_frame, title="Прогноз на 2025",
-                                 value=f"{predicted_price[0]:,.0f}", unit="₽/м²",
-                                 color=colors["trend"])
-        forecast_card.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-
-        # Карточка с оптимистичным прогнозом
-        optimistic_card = InfoCard(stats_frame, title="Оптимистичный (+15%)",
-                                   value=f"{optimistic_price[0]:,.0f}", unit="₽/м²",
-                                   color=colors["optimistic"])
-        optimistic_card.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-
-        # Карточка с пессимистичным прогнозом
-        pessimistic_card = InfoCard(stats_frame, title="Пессимистичный (-15%)",
-                                    value=f"{pessimistic_price[0]:,.0f}", unit="₽/м²",
-                                    color=colors["pessimistic"])
-        pessimistic_card.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-
-        # Анимированное построение графика
-        def animate(i):
-            ax.clear()
-
-            # Настройки осей
-            ax.set_facecolor(theme.colors["graph_bg"])
-            for spine in ax.spines.values():
-                spine.set_color(theme.colors["text"])
-            ax.tick_params(colors=theme.colors["text"])
-            ax.grid(True, color=theme.colors["graph_grid"], linestyle='--', alpha=0.5)
-
-            # Постепенное построение графика
-            if i < len(df["year"]):
-                current_years = df["year"][:i + 1]
-                current_prices = y[:i + 1]
-                ax.plot(current_years, current_prices, 'o-', color=colors["historical"],
-                        label="Исторические данные", linewidth=2, markersize=6)
-            else:
-                ax.plot(df["year"], y, 'o-', color=colors["historical"],
-                        label="Исторические данные", linewidth=2, markersize=6)
-
-                if i < len(df["year"]) + 15:
-                    progress = min(1, (i - len(df["year"]) + 1) / 15)
-                    ax.plot(df["year"], model.predict(X), '--', color=colors["trend"],
-                            alpha=progress, label="Базовый тренд", linewidth=2)
-                else:
-                    ax.plot(df["year"], model.predict(X), '--', color=colors["trend"],
-                            label="Базовый тренд", linewidth=2)
-
-                    if i < len(df["year"]) + 30:
-                        progress = min(1, (i - len(df["year"]) - 14) / 15)
-                        ax.plot(df["year"], optimistic_model.predict(X), ':', color=colors["optimistic"],
-                                alpha=progress, label="Оптимистичный (+15%)", linewidth=2)
-                        ax.plot(df["year"], pessimistic_model.predict(X), ':', color=colors["pessimistic"],
-                                alpha=progress, label="Пессимистичный (-15%)", linewidth=2)
-                    else:
-                        ax.plot(df["year"], optimistic_model.predict(X), ':', color=colors["optimistic"],
-                                label="Оптимистичный (+15%)", linewidth=2)
-                        ax.plot(df["year"], pessimistic_model.predict(X), ':', color=colors["pessimistic"],
-                                label="Пессимистичный (-15%)", linewidth=2)
-
-                        if i < len(df["year"]) + 45:
-                            progress = min(1, (i - len(df["year"]) - 29) / 15)
-                            ax.scatter(2025, predicted_price, color=colors["trend"], s=100,
-                                       alpha=progress, label=f"2025: {predicted_price[0]:.0f} ₽/м²")
-                            ax.scatter(2025, optimistic_price, color=colors["optimistic"], s=100,
-                                       alpha=progress, label=f"2025 (+15%): {optimistic_price[0]:.0f} ₽/м²")
-                            ax.scatter(2025, pessimistic_price, color=colors["pessimistic"], s=100,
-                                       alpha=progress, label=f"2025 (-15%): {pessimistic_price[0]:.0f} ₽/м²")
-                        else:
-                            ax.scatter(2025, predicted_price, color=colors["trend"], s=100,
-                                       label=f"2025: {predicted_price[0]:.0f} ₽/м²")
-                            ax.scatter(2025, optimistic_price, color=colors["optimistic"], s=100,
-                                       label=f"2025 (+15%): {optimistic_price[0]:.0f} ₽/м²")
-                            ax.scatter(2025, pessimistic_price, color=colors["pessimistic"], s=100,
-                                       label=f"2025 (-15%): {pessimistic_price[0]:.0f} ₽/м²")
-
-            ax.set_title(f"Динамика цен в {city}", fontsize=12, color=theme.colors["text"], pad=10)
-            ax.set_xlabel("Год", fontsize=10, color=theme.colors["text"])
-            ax.set_ylabel("Цена, ₽/м²", fontsize=10, color=theme.colors["text"])
-            ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-
-            # Легенда
-            legend = ax.legend(facecolor=theme.colors["graph_bg"], edgecolor='none',
-                               labelcolor=theme.colors["text"],
-                               bbox_to_anchor=(0.5, -0.25),
-                               loc='upper center',
-                               ncol=2,
-                               fontsize=9)
-
-        # Обработчик движения мыши для отображения информации
-        def on_motion(event):
-            if event.inaxes == ax:
-                for line in ax.lines:
-                    if line.contains(event)[0]:
-                        x, y = line.get_data()
-                        idx = np.argmin(np.abs(x - event.xdata))
-                        info_text.set(f"{city}, {int(x[idx])} год: {y[idx]:.0f} ₽/м²")
-                        break
-                else:
-                    for collection in ax.collections:
-                        if collection.contains(event)[0]:
-                            x = collection.get_offsets()[:, 0]
-                            y = collection.get_offsets()[:, 1]
-                            info_text.set(f"Прогноз {city}, 2025 год: {y[0]:.0f} ₽/м²")
-                            break
-
-        fig.canvas.mpl_connect('motion_notify_event', on_motion)
-
-        # Встраиваем график в интерфейс
-        canvas = FigureCanvasTkAgg(fig, master=frame_graph)
-        canvas.draw()
-        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
+    def on_row_open(self, event):
+        city = self.table.identify_row(event.y)
+        if city:
+            plot_forecast(city)
 
-        # Запускаем анимацию
-        global anim
-        anim = animation.FuncAnimation(fig, animate, frames=len(df["year"]) + 45, interval=50, repeat=False)
+    def on_motion(self, event):
+        if event.inaxes != self.chart.ax:
+            return
+        hit = self.chart.points.nearest(self.chart.ax, event)
+        if hit is None:
+            return
+        (i, series), year, price = hit
+        kind = "прогноз" if series == "forecast" else "цена"
+        set_hover_text(self.info_text, f"{self.chart.names[i]}, {int(year)} год, {kind}: {price:.0f} ₽/м²")
 
-        # Описание города
-        description, wiki_url = get_city_info(city)
-        desc_frame = tk.Frame(frame_graph, bg=theme.colors["bg"])
-        desc_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+    def destroy(self):
+        self.hover.cancel()
+        super().destroy()
 
-        tk.Label(desc_frame, text=description, wraplength=700, justify=tk.LEFT,
-                 bg=theme.colors["bg"], fg=theme.colors["text_secondary"], font=FONT).pack(side=tk.LEFT)
 
-        # Кнопки управления
-        btn_frame = tk.Frame(frame_graph, bg=theme.colors["bg"])
-        btn_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+def show_loading():
+    global loading_overlay
+    hide_loading()
+    loading_overlay = LoadingAnimation(frame_graph, size=80, color=theme.colors["accent"])
+    loading_overlay.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
 
-        if wiki_url:
-            SmoothButton(btn_frame, text="Википедия", width=100,
-                         command=lambda: open_wiki(wiki_url)).pack(side=tk.LEFT, padx=5)
 
-        SmoothButton(btn_frame, text="Диаграмма", width=100,
-                     command=lambda: show_bar_chart(city)).pack(side=tk.LEFT, padx=5)
+def hide_loading():
+    global loading_overlay
+    if loading_overlay is not None:
+        loading_overlay.destroy()
+        loading_overlay = None
 
-        SmoothButton(btn_frame, text="Удалить", width=100, bg_color=theme.colors["danger"],
-                     hover_color="#ab4a4a", command=lambda: confirm_delete_city(city)).pack(side=tk.RIGHT, padx=5)
 
-        # Убираем анимацию загрузки
-        loading.stop_animation()
-        loading.destroy()
+def show_placeholder():
+    task_runner.cancel("forecast")
+    hide_loading()
+    if forecast_view is not None:
+        forecast_view.stop_animation()
+        forecast_view.pack_forget()
+    if comparison_view is not None:
+        comparison_view.pack_forget()
+    placeholder_label.pack(pady=50)
+
+
+def get_horizon():
+    try:
+        horizon = horizon_var.get()
+    except tk.TclError:
+        horizon = DEFAULT_HORIZON
+    return min(max(horizon, 1), MAX_HORIZON)
+
 
+def get_model_name():
+    title = model_var.get()
+    for name, model_title in MODEL_TITLES.items():
+        if model_title == title:
+            return name
+    return DEFAULT_MODEL
+
+
+# Время от выбора города до готового графика (ui.forecast_total) складывается из этапов:
+# forecast.sql, forecast.fit.*, forecast.city_info в фоне и forecast.show, chart.* в главном потоке
+def plot_forecast(city):
+    started = time.perf_counter()
+    horizon = get_horizon()
+    model = get_model_name()
+    # Повторный просмотр города с неизменёнными данными — без фонового расчёта
+    cached = forecast_cache.get((city, db.data_version(city), horizon, model))
+    if cached is not None:
+        task_runner.cancel("forecast")
+        hide_loading()
+        show_forecast(city, cached)
+        profiling.record("ui.forecast_total.cached", (time.perf_counter() - started) * 1000)
+        return
+
+    # Анимация загрузки крутится, пока данные считаются в фоне
+    show_loading()
+
+    def on_done(forecast):
+        hide_loading()
+        if forecast is None:
+            messagebox.showerror("Ошибка", f"Нет данных для города {city}")
+            return
+        show_forecast(city, forecast)
+        profiling.record("ui.forecast_total", (time.perf_counter() - started) * 1000)
+
+    def on_error(e):
+        hide_loading()
+        messagebox.showerror("Ошибка", f"Произошла ошибка: {str(e)}")
+
+    # Новый выбор города отменяет незавершённый расчёт предыдущего
+    task_runner.submit(compute_forecast, city, horizon, model,
+                       on_done=on_done, on_error=on_error, key="forecast")
+
+
+def show_forecast(city, forecast):
+    global forecast_view
+    try:
+        if forecast_view is None:
+            with profiling.span("forecast.create_view"):
+                forecast_view = ForecastView(frame_graph)
+        placeholder_label.pack_forget()
+        if comparison_view is not None:
+            comparison_view.pack_forget()
+        forecast_view.pack(fill=tk.BOTH, expand=True)
+        with profiling.span("forecast.show"):
+            forecast_view.show(city, forecast, animate=animate_var.get())
+    except Exception as e:
+        messagebox.showerror("Ошибка", f"Произошла ошибка: {str(e)}")
+
+
+def plot_comparison(cities, total=None):
+    started = time.perf_counter()
+    horizon = get_horizon()
+    model = get_model_name()
+    show_loading()
+
+    def on_done(comparison):
+        hide_loading()
+        if comparison is None:
+            messagebox.showerror("Ошибка", "Нет данных для выбранных городов")
+            return
+        show_comparison(cities, comparison, total)
+        profiling.record("ui.comparison_total", (time.perf_counter() - started) * 1000)
+
+    def on_error(e):
+        hide_loading()
+        messagebox.showerror("Ошибка", f"Произошла ошибка: {str(e)}")
+
+    # Тот же ключ, что у прогноза: новый выбор отменяет незавершённый расчёт
+    task_runner.submit(compute_comparison, cities, horizon, model,
+                       on_done=on_done, on_error=on_error, key="forecast")
+
+
+def show_comparison(cities, comparison, total=None):
+    global comparison_view
+    try:
+        if comparison_view is None:
+            comparison_view = ComparisonView(frame_graph)
+        placeholder_label.pack_forget()
+        if forecast_view is not None:
+            forecast_view.stop_animation()
+            forecast_view.pack_forget()
+        comparison_view.pack(fill=tk.BOTH, expand=True)
+        comparison_view.show(cities, comparison, total)
     except Exception as e:
         messagebox.showerror("Ошибка", f"Произошла ошибка: {str(e)}")
-        if 'loading' in locals():
-            loading.stop_animation()
-            loading.destroy()
 
 
 def show_bar_chart(city):
@@ -640,62 +1288,56 @@ def show_bar_chart(city):
 
         loading_window.update()
 
-        df = get_city_data(city)
-        if df.empty:
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from charts import BarChart
+
+        with profiling.span("bar_chart.sql"):
+            rows = get_city_data(city)
+        if not rows:
             messagebox.showerror("Ошибка", f"Нет данных для города {city}")
             loading_window.destroy()
             return
 
-        fig, ax = plt.subplots(figsize=(8, 5), dpi=100)
-        fig.patch.set_facecolor(theme.colors["graph_bg"])
-        ax.set_facecolor(theme.colors["graph_bg"])
+        # Figure без pyplot: освобождается вместе с окном диаграммы
+        with profiling.span("bar_chart.update"):
+            chart = BarChart()
+            chart.update(city, [row[0] for row in rows], [row[1] for row in rows])
 
-        bars = ax.bar(df["year"], df["average_price"], color=theme.colors["accent"])
-
-        ax.set_title(f"Цены за м² в {city}", fontsize=12, color=theme.colors["text"])
-        ax.set_xlabel("Год", fontsize=10, color=theme.colors["text"])
-        ax.set_ylabel("Цена, ₽/м²", fontsize=10, color=theme.colors["text"])
-        ax.grid(True, axis='y', color=theme.colors["graph_grid"], linestyle='--', alpha=0.5)
-        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        # Закрываем окно загрузки и открываем диаграмму
+        loading_window.destroy()
 
-        # Настройка цветов осей
-        for spine in ax.spines.values():
-            spine.set_color(theme.colors["text"])
-        ax.tick_params(colors=theme.colors["text"])
+        chart_window = tk.Toplevel(root)
+        chart_window.title(f"Диаграмма цен - {city}")
+        chart_window.geometry("800x600")
+        chart_window.configure(bg=theme.colors["bg"])
 
         # Информационное окно
         info_text = tk.StringVar()
         info_text.set("Наведите курсор на столбцы для информации")
 
-        info_frame = tk.Frame(loading_window, bg=theme.colors["tooltip_bg"], padx=10, pady=5)
-        info_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        info_frame = tk.Frame(chart_window, bg=theme.colors["tooltip_bg"], padx=10, pady=5)
+        info_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
 
         tk.Label(info_frame, textvariable=info_text, bg=theme.colors["tooltip_bg"],
                  fg=theme.colors["tooltip_text"], font=FONT_SMALL).pack()
 
-        # Добавляем подсказки
-        def hover(event):
-            if event.inaxes == ax:
-                for bar in bars:
-                    if bar.contains(event)[0]:
-                        year = int(bar.get_x() + bar.get_width() / 2)
-                        price = bar.get_height()
-                        info_text.set(f"{city}, {year} год: {price:.0f} ₽/м²")
-                        break
-
-        fig.canvas.mpl_connect("motion_notify_event", hover)
-
-        # Закрываем окно загрузки и открываем диаграмму
-        loading_window.destroy()
+        canvas = FigureCanvasTkAgg(chart.figure, master=chart_window)
+        with profiling.span("bar_chart.draw"):
+            canvas.draw()
+        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        chart_window = tk.Toplevel(root)
-        chart_window.title(f"Диаграмма цен - {city}")
-        chart_window.geometry("800x600")
-        chart_window.configure(bg=theme.colors["bg"])
+        # Подсказки: столбец под курсором ищется по отсортированным центрам
+        def hover(event):
+            if event.inaxes != chart.ax:
+                return
+            hit = chart.bar_at(event.xdata, event.ydata)
+            if hit is not None:
+                year, price = hit
+                set_hover_text(info_text, f"{city}, {int(year)} год: {price:.0f} ₽/м²")
 
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
+        hover_throttle = HoverThrottle(chart_window, hover)
+        canvas.mpl_connect("motion_notify_event", hover_throttle)
+        chart_window.bind("<Destroy>", lambda e: hover_throttle.cancel() if e.widget is chart_window else None)
 
         # Кнопка закрытия
         btn_frame = tk.Frame(chart_window, bg=theme.colors["bg"])
@@ -714,44 +1356,94 @@ def confirm_delete_city(city):
     if messagebox.askyesno("Подтверждение", f"Вы уверены, что хотите удалить город {city} из базы данных?"):
         if delete_city_from_db(city):
             update_city_list()
-            # Очищаем график
-            for widget in frame_graph.winfo_children():
-                widget.destroy()
-
-            # Добавляем сообщение о выборе города
-            tk.Label(frame_graph, text="Выберите город для отображения данных",
-                     bg=theme.colors["bg"], fg=theme.colors["text_secondary"], font=FONT_TITLE).pack(pady=50)
+            # Убираем график и показываем сообщение о выборе города
+            show_placeholder()
 
 
 # Обработка выбора города
+# ui.city_select — работа главного потока при щелчке (с кэшем — до готового графика)
 def on_city_select(event):
     try:
-        if not city_listbox.curselection():
+        selection = city_listbox.curselection()
+        if not selection:
             return
 
-        selected_city = city_listbox.get(city_listbox.curselection())
+        # Несколько выбранных городов (Ctrl/Shift+щелчок) — сравнение
+        if len(selection) > 1:
+            with profiling.span("ui.city_select"):
+                cities = [city_listbox.get(index) for index in selection[:MAX_COMPARE_CITIES]]
+                plot_comparison(cities, total=len(selection))
+            return
+
+        selected_city = city_listbox.get(selection[0])
         if isinstance(selected_city, str):
-            plot_forecast(selected_city)
+            with profiling.span("ui.city_select"):
+                plot_forecast(selected_city)
         else:
             messagebox.showerror("Ошибка", "Выберите город из списка")
     except Exception as e:
         messagebox.showerror("Ошибка", f"Ошибка при выборе города: {str(e)}")
 
 
-# Поиск города по вводу
+# Смена горизонта или модели перестраивает прогноз выбранного города
+def on_forecast_settings_change(*args):
+    settings = (get_horizon(), get_model_name())
+    if comparison_view is not None and comparison_view.winfo_ismapped():
+        if settings != (comparison_view.horizon, comparison_view.model):
+            plot_comparison(comparison_view.cities)
+        return
+    if forecast_view is None or not forecast_view.city or not forecast_view.winfo_ismapped():
+        return
+    if settings != (forecast_view.horizon, forecast_view.model):
+        plot_forecast(forecast_view.city)
+
+
+# Поиск города по вводу: запрос выполняется после паузы в наборе
+SEARCH_DEBOUNCE_MS = 150
+
+
 def filter_cities(event):
-    search_term = city_search_var.get().lower()
-    filtered = [c for c in all_cities if search_term in c.lower()]
-    city_listbox.delete(0, tk.END)
-    for city in filtered:
-        city_listbox.insert(tk.END, city)
+    global search_after_id
+    if search_after_id is not None:
+        root.after_cancel(search_after_id)
+    search_after_id = root.after(SEARCH_DEBOUNCE_MS, apply_city_filter)
+
+
+def apply_city_filter():
+    global search_after_id
+    search_after_id = None
+    term = city_search_var.get()
+    if not term:
+        if city_listbox.source is not city_source:
+            city_listbox.set_source(city_source)
+    elif city_index is not None:
+        cities = city_index.search(term)
+        # Список обновляется, только если результат изменился
+        if cities != getattr(city_listbox.source, "items", None):
+            city_listbox.set_source(ListSource(cities))
+    # Иначе индекс ещё строится: фильтр применится, когда он будет готов
+
+
+# Высота прокручиваемого списка цен в окне добавления города
+ADD_CITY_PRICES_HEIGHT = 180
+# Сколько лет предлагать, если база пуста
+DEFAULT_ENTRY_YEARS = 5
+
+
+# Годы полей цен в окне добавления города: годы из базы или последние DEFAULT_ENTRY_YEARS лет
+def get_entry_years():
+    years = db.get_years()
+    if years:
+        return years
+    last_year = time.localtime().tm_year - 1
+    return list(range(last_year - DEFAULT_ENTRY_YEARS + 1, last_year + 1))
 
 
 # Функция для добавления города
 def add_city():
     add_city_window = tk.Toplevel(root)
     add_city_window.title("Добавить новый город")
-    add_city_window.geometry("500x650")
+    add_city_window.geometry("500x700")
     add_city_window.configure(bg=theme.colors["bg"])
     add_city_window.resizable(False, False)
 
@@ -778,11 +1470,33 @@ def add_city():
     # Поля ввода
     city_entry = create_entry_row(container, "Название города:")
 
-    price_2020_entry = create_entry_row(container, "Цена за м² в 2020:")
-    price_2021_entry = create_entry_row(container, "Цена за м² в 2021:")
-    price_2022_entry = create_entry_row(container, "Цена за м² в 2022:")
-    price_2023_entry = create_entry_row(container, "Цена за м² в 2023:")
-    price_2024_entry = create_entry_row(container, "Цена за м² в 2024:")
+    # Цены по годам: годы берутся из базы, список прокручивается
+    prices_frame = tk.Frame(container, bg=theme.colors["bg"])
+    prices_frame.pack(fill=tk.X, pady=5)
+    prices_canvas = tk.Canvas(prices_frame, bg=theme.colors["bg"], highlightthickness=0,
+                              height=ADD_CITY_PRICES_HEIGHT)
+    prices_scrollbar = ttk.Scrollbar(prices_frame, orient=tk.VERTICAL, command=prices_canvas.yview)
+    prices_canvas.configure(yscrollcommand=prices_scrollbar.set)
+    prices_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    prices_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    rows_frame = tk.Frame(prices_canvas, bg=theme.colors["bg"])
+    rows_window = prices_canvas.create_window(0, 0, window=rows_frame, anchor="nw")
+    rows_frame.bind("<Configure>",
+                    lambda e: prices_canvas.configure(scrollregion=prices_canvas.bbox("all")))
+    prices_canvas.bind("<Configure>", lambda e: prices_canvas.itemconfigure(rows_window, width=e.width))
+
+    price_entries = {}
+
+    def add_year_row(year):
+        price_entries[year] = create_entry_row(rows_frame, f"Цена за м² в {year}:")
+        prices_canvas.update_idletasks()
+        prices_canvas.yview_moveto(1)
+
+    for year in get_entry_years():
+        add_year_row(year)
+
+    SmoothButton(container, text="Добавить год", width=120,
+                 command=lambda: add_year_row(max(price_entries) + 1)).pack(anchor="e", pady=5)
 
     # Описание
     tk.Label(container, text="Описание города:", bg=theme.colors["bg"],
@@ -804,13 +1518,11 @@ def add_city():
             if not city:
                 raise ValueError("Название города не может быть пустым")
 
-            prices = [
-                (2020, float(price_2020_entry.get())),
-                (2021, float(price_2021_entry.get())),
-                (2022, float(price_2022_entry.get())),
-                (2023, float(price_2023_entry.get())),
-                (2024, float(price_2024_entry.get()))
-            ]
+            # Незаполненные годы пропускаются
+            prices = [(year, float(entry.get())) for year, entry in sorted(price_entries.items())
+                      if entry.get().strip()]
+            if not prices:
+                raise ValueError("Укажите цену хотя бы за один год")
 
             description = description_text.get("1.0", tk.END).strip()
             wiki_link = wiki_entry.get()
@@ -821,6 +1533,8 @@ def add_city():
 
         except ValueError as e:
             messagebox.showerror("Ошибка", f"Проверьте введенные данные:\n{str(e)}")
+        except db.DatabaseBusy as e:
+            messagebox.showwarning("База данных занята", str(e))
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка при сохранении: {str(e)}")
 
@@ -832,6 +1546,120 @@ def add_city():
     cancel_btn.pack(side=tk.RIGHT)
 
 
+# Панель профилирования (F12): гистограммы интервалов, зависания цикла событий, захват cProfile
+DEBUG_REFRESH_MS = 1000
+
+
+class DebugPanel(tk.Toplevel):
+    COLUMNS = ("name", "count", "mean", "p50", "p95", "max", "total")
+
+    def __init__(self, master=None):
+        super().__init__(master)
+        self.title("Профилирование")
+        self.geometry("900x650")
+        self.configure(bg=theme.colors["bg"])
+        self.refresh_id = None
+
+        configure_table_style(self)
+        self.table = ttk.Treeview(self, columns=self.COLUMNS, show="headings", height=14, style=TABLE_STYLE)
+        headings = {
+            "name": ("Интервал", 260),
+            "count": ("Вызовов", 80),
+            "mean": ("Среднее, мс", 100),
+            "p50": ("p50, мс", 90),
+            "p95": ("p95, мс", 90),
+            "max": ("Макс., мс", 90),
+            "total": ("Всего, мс", 110),
+        }
+        for column, (title, width) in headings.items():
+            self.table.heading(column, text=title)
+            self.table.column(column, width=width, anchor="w" if column == "name" else "e",
+                              stretch=column == "name")
+        self.table.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+
+        tk.Label(self, text="Зависания интерфейса и отчёт cProfile:", bg=theme.colors["bg"],
+                 fg=theme.colors["text"], font=FONT_BOLD, anchor="w").pack(fill=tk.X, padx=10)
+        self.report = tk.Text(self, height=12, font=("Consolas", 9), wrap=tk.NONE,
+                              bg=theme.colors["entry_bg"], fg=theme.colors["text"])
+        self.report.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.showing_profile = False
+
+        btn_frame = tk.Frame(self, bg=theme.colors["bg"])
+        btn_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        SmoothButton(btn_frame, text="Сбросить", width=100, command=self.on_reset).pack(side=tk.LEFT, padx=5)
+        SmoothButton(btn_frame, text="Сохранить JSON", width=130, command=self.on_dump).pack(side=tk.LEFT, padx=5)
+        self.capture_button = SmoothButton(btn_frame, width=170, command=self.on_capture,
+                                           text=self.capture_title())
+        self.capture_button.pack(side=tk.LEFT, padx=5)
+        SmoothButton(btn_frame, text="Закрыть", width=100, command=self.destroy).pack(side=tk.RIGHT, padx=5)
+
+        self.refresh()
+
+    @staticmethod
+    def capture_title():
+        return "Остановить cProfile" if profiling.capture_active() else "Запустить cProfile"
+
+    def refresh(self):
+        snapshot = profiling.snapshot()
+        self.table.delete(*self.table.get_children())
+        for name, span in snapshot["spans"].items():
+            self.table.insert("", tk.END, values=(
+                name, span["count"], f"{span['mean_ms']:.2f}", f"{span['p50_ms']:.2f}",
+                f"{span['p95_ms']:.2f}", f"{span['max_ms']:.1f}", f"{span['total_ms']:.0f}"))
+        # Пока показан отчёт cProfile, список зависаний его не затирает
+        if not self.showing_profile:
+            lines = [f"{stall['time']}  {stall['ms']:.0f} мс"
+                     + (f"  (дольше всего: {stall['span']}, {stall['span_ms']:.0f} мс)" if stall["span"] else "")
+                     for stall in reversed(snapshot["stalls"])]
+            self.set_report("\n".join(lines) or "Зависаний не было")
+        self.refresh_id = self.after(DEBUG_REFRESH_MS, self.refresh)
+
+    def set_report(self, text):
+        self.report.config(state="normal")
+        self.report.delete("1.0", tk.END)
+        self.report.insert(tk.END, text)
+        self.report.config(state="disabled")
+
+    def on_reset(self):
+        profiling.reset()
+        self.showing_profile = False
+
+    def on_dump(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json",
+                                            filetypes=[("JSON файлы", "*.json")])
+        if path:
+            try:
+                profiling.dump(path)
+            except OSError as e:
+                messagebox.showerror("Ошибка", f"Не удалось сохранить файл: {str(e)}", parent=self)
+
+    # Захват cProfile: при остановке можно сохранить статистику (.prof для snakeviz/pstats)
+    def on_capture(self):
+        if not profiling.capture_active():
+            profiling.start_capture()
+            self.showing_profile = False
+        else:
+            path = filedialog.asksaveasfilename(parent=self, defaultextension=".prof",
+                                                filetypes=[("Статистика cProfile", "*.prof")])
+            self.set_report(profiling.stop_capture(path or None))
+            self.showing_profile = True
+        self.capture_button.set_text(self.capture_title())
+
+    def destroy(self):
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        super().destroy()
+
+
+def show_debug_panel(event=None):
+    global debug_panel
+    if debug_panel is not None and debug_panel.winfo_exists():
+        debug_panel.lift()
+        return
+    debug_panel = DebugPanel(root)
+
+
 # Функция для отображения справки
 def show_help():
     help_window = tk.Toplevel(root)
@@ -894,17 +1722,21 @@ def show_help():
 
 Основные возможности:
 1. Визуализация динамики цен по годам
-2. Прогнозирование цен на 2025 год (3 сценария)
+2. Прогнозирование цен на несколько лет вперёд (3 сценария, выбор модели:
+   линейный тренд, логлинейный (CAGR), Хольт, устойчивая регрессия)
 3. Интерактивные графики с подсказками
+   Сравнение городов: выделите несколько городов в списке (Ctrl+щелчок или Shift+щелчок,
+   до 20 городов) — общий график и рейтинг по темпам роста
 4. Управление базой данных городов
 5. Импорт/экспорт данных в различных форматах
 
 График показывает:
 - Фактические цены по годам (синие точки)
 - Базовый прогноз (зеленая линия)
-- Оптимистичный сценарий (+15%, оранжевая линия)
-- Пессимистичный сценарий (-15%, красная линия)
-- Прогнозируемые значения на 2025 год
+- Оптимистичный сценарий (верхняя граница 80% интервала прогноза, оранжевая линия)
+- Пессимистичный сценарий (нижняя граница 80% интервала прогноза, красная линия)
+  Ширина интервала зависит от разброса цен города вокруг линии модели
+- Прогнозируемые значения на каждый год горизонта прогноза
 
 Инструкция:
 1. Выберите город из списка слева
@@ -912,10 +1744,18 @@ def show_help():
 3. Используйте кнопки под графиком для дополнительных действий
 4. Добавляйте новые города через меню "Добавить город"
 
+Профилирование: F12 открывает панель с временем этапов (SQL, расчёт, отрисовка),
+зависаниями интерфейса и захватом cProfile; сводку можно сохранить в JSON
+
 Форматы данных:
-- TXT: список кортежей в Python-формате
-- JSON: массив записей в формате JSON
-Каждая запись содержит: город, год, цену, описание, ссылку"""
+- TXT: список кортежей в Python-формате [("город", год, цена, "описание", "ссылка"), ...]
+- JSON: массив записей в формате JSON или NDJSON (по одной записи в строке)
+- CSV: city,year,price,description,wiki_link (как при экспорте)
+Кнопки "Импорт файлов" и "Импорт папки" загружают сразу несколько файлов:
+они разбираются параллельно, неверные записи пропускаются и перечисляются в итогах;
+в базу пишутся только новые и изменившиеся цены (итоги показывают, сколько каких)
+Каждая запись содержит: город, год, цену, описание, ссылку.
+Год — целое число, цена — число; при ошибке в TXT сообщается номер строки файла"""
 
     text_widget = tk.Text(func_frame, height=25, width=80, font=FONT, wrap=tk.WORD,
                           bg=theme.colors["entry_bg"], fg=theme.colors["text"])
@@ -929,81 +1769,187 @@ def show_help():
 
 
 # Функция для обновления списка городов
+# Список показывается сразу по количеству городов, страницы читаются при прокрутке;
+# поисковый индекс строится в фоне
 def update_city_list():
-    global all_cities
-    all_cities = get_cities()
-    city_listbox.delete(0, tk.END)
-    for city in all_cities:
-        city_listbox.insert(tk.END, city)
-
-
-# Создание главного окна
-root = tk.Tk()
-root.title("Анализ цен на недвижимость")
-root.geometry("1200x800")
-root.configure(bg=theme.colors["bg"])
-
-# Верхняя панель
-top_frame = tk.Frame(root, bg=theme.colors["panel"], height=50)
-top_frame.pack(fill=tk.X, padx=10, pady=10)
-
-# Кнопки управления
-SmoothButton(top_frame, text="Добавить город", width=140,
-             command=add_city).pack(side=tk.LEFT, padx=5)
-
-SmoothButton(top_frame, text="Импорт TXT", width=100,
-             command=load_from_txt).pack(side=tk.LEFT, padx=5)
-
-SmoothButton(top_frame, text="Импорт JSON", width=100,
-             command=load_from_json).pack(side=tk.LEFT, padx=5)
+    global city_source, city_index
+    city_source = DatabaseCitySource()
+    city_index = None
+    city_listbox.set_source(city_source)
+    task_runner.submit(build_city_index, on_done=on_city_index_ready, key="city_index")
+    apply_city_filter()
 
-SmoothButton(top_frame, text="Экспорт TXT", width=100,
-             command=export_to_txt).pack(side=tk.LEFT, padx=5)
 
-SmoothButton(top_frame, text="Экспорт JSON", width=100,
-             command=export_to_json).pack(side=tk.LEFT, padx=5)
+def build_city_index(token):
+    return CityIndex(get_cities())
 
-SmoothButton(top_frame, text="Справка", width=80,
-             command=show_help).pack(side=tk.RIGHT, padx=5)
 
-# Основное содержимое
-main_frame = tk.Frame(root, bg=theme.colors["bg"])
-main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+def on_city_index_ready(index):
+    global city_index
+    city_index = index
+    if city_search_var.get():
+        apply_city_filter()
 
-# Левая панель - список городов
-left_panel = tk.Frame(main_frame, bg=theme.colors["panel"], width=280)
-left_panel.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
 
-tk.Label(left_panel, text="Поиск города:", bg=theme.colors["panel"],
-         fg=theme.colors["text"], font=FONT_BOLD).pack(pady=(10, 5), padx=10, anchor="w")
+def on_close():
+    stall_monitor.stop()
+    task_runner.shutdown()
+    file_task_runner.shutdown()
+    db.close()
+    root.destroy()
+
+
+# Переменная окружения для замера времени запуска
+STARTUP_PROBE_ENV = "REAL_ESTATE_STARTUP_PROBE"
+
+
+def report_startup():
+    root.update()
+    print(f"window_ready {time.time():.6f}", flush=True)
+    on_close()
+
+
+# Создание главного окна. Импорт модуля не создаёт окно,
+# поэтому логику приложения можно использовать и без Tk
+def main():
+    global root, animate_var, horizon_var, model_var, city_search_var, search_after_id, city_source, city_index
+    global city_listbox, frame_graph, placeholder_label, forecast_view, comparison_view, loading_overlay
+    global task_runner, file_task_runner, stall_monitor, debug_panel
+
+    # Создание главного окна
+    root = tk.Tk()
+    root.title("Анализ цен на недвижимость")
+    root.geometry("1200x800")
+    root.configure(bg=theme.colors["bg"])
+
+    # Верхняя панель
+    top_frame = tk.Frame(root, bg=theme.colors["panel"], height=50)
+    top_frame.pack(fill=tk.X, padx=10, pady=10)
+
+    # Кнопки управления
+    SmoothButton(top_frame, text="Добавить город", width=140,
+                 command=add_city).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Импорт TXT", width=100,
+                 command=load_from_txt).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Импорт JSON", width=100,
+                 command=load_from_json).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Импорт файлов", width=120,
+                 command=load_many_files).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Импорт папки", width=110,
+                 command=load_from_folder).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Экспорт TXT", width=100,
+                 command=export_to_txt).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Экспорт JSON", width=100,
+                 command=export_to_json).pack(side=tk.LEFT, padx=5)
+
+    SmoothButton(top_frame, text="Экспорт CSV", width=100,
+                 command=export_to_table).pack(side=tk.LEFT, padx=5)
 
-city_search_var = tk.StringVar()
-search_entry = tk.Entry(left_panel, bg=theme.colors["entry_bg"], fg=theme.colors["text"],
-                        insertbackground=theme.colors["text"], relief=tk.FLAT,
-                        textvariable=city_search_var)
-search_entry.pack(fill=tk.X, padx=10, pady=(0, 10))
-search_entry.bind("<KeyRelease>", filter_cities)
+    SmoothButton(top_frame, text="Справка", width=80,
+                 command=show_help).pack(side=tk.RIGHT, padx=5)
 
-scrollbar = tk.Scrollbar(left_panel)
-scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    # Анимация построения графика (можно отключить)
+    animate_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(top_frame, text="Анимация графика", variable=animate_var,
+                   bg=theme.colors["panel"], fg=theme.colors["text"], font=FONT,
+                   selectcolor=theme.colors["entry_bg"], activebackground=theme.colors["panel"],
+                   activeforeground=theme.colors["text"]).pack(side=tk.RIGHT, padx=5)
 
-city_listbox = CityListbox(left_panel, yscrollcommand=scrollbar.set, height=30)
-city_listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
-city_listbox.bind("<<ListboxSelect>>", on_city_select)
+    # Горизонт прогноза
+    horizon_var = tk.IntVar(value=DEFAULT_HORIZON)
+    horizon_spinbox = tk.Spinbox(top_frame, from_=1, to=MAX_HORIZON, width=4, textvariable=horizon_var,
+                                 command=on_forecast_settings_change, bg=theme.colors["entry_bg"],
+                                 fg=theme.colors["text"], buttonbackground=theme.colors["button"],
+                                 insertbackground=theme.colors["text"], relief=tk.FLAT, font=FONT)
+    horizon_spinbox.pack(side=tk.RIGHT, padx=5)
+    horizon_spinbox.bind("<Return>", on_forecast_settings_change)
+    horizon_spinbox.bind("<FocusOut>", on_forecast_settings_change)
+    tk.Label(top_frame, text="Горизонт, лет:", bg=theme.colors["panel"], fg=theme.colors["text"],
+             font=FONT).pack(side=tk.RIGHT)
 
-scrollbar.config(command=city_listbox.yview)
+    # Модель прогноза
+    model_var = tk.StringVar(value=MODEL_TITLES[DEFAULT_MODEL])
+    model_combobox = ttk.Combobox(top_frame, textvariable=model_var, values=list(MODEL_TITLES.values()),
+                                  state="readonly", width=20, font=FONT)
+    model_combobox.pack(side=tk.RIGHT, padx=5)
+    model_combobox.bind("<<ComboboxSelected>>", on_forecast_settings_change)
 
-# Правая панель - график
-frame_graph = tk.Frame(main_frame, bg=theme.colors["bg"])
-frame_graph.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+    # Основное содержимое
+    main_frame = tk.Frame(root, bg=theme.colors["bg"])
+    main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
 
-# Начальное сообщение
-tk.Label(frame_graph, text="Выберите город для отображения данных",
-         bg=theme.colors["bg"], fg=theme.colors["text_secondary"], font=FONT_TITLE).pack(pady=50)
+    # Левая панель - список городов
+    left_panel = tk.Frame(main_frame, bg=theme.colors["panel"], width=280)
+    left_panel.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
 
-# Загрузка данных
-create_database()
-all_cities = get_cities()
-update_city_list()
+    tk.Label(left_panel, text="Поиск города:", bg=theme.colors["panel"],
+             fg=theme.colors["text"], font=FONT_BOLD).pack(pady=(10, 5), padx=10, anchor="w")
 
-root.mainloop()
\ No newline at end of file
+    city_search_var = tk.StringVar()
+    search_entry = tk.Entry(left_panel, bg=theme.colors["entry_bg"], fg=theme.colors["text"],
+                            insertbackground=theme.colors["text"], relief=tk.FLAT,
+                            textvariable=city_search_var)
+    search_entry.pack(fill=tk.X, padx=10, pady=(0, 10))
+    search_entry.bind("<KeyRelease>", filter_cities)
+    search_after_id = None
+    city_source = ListSource([])
+    city_index = None
+
+    scrollbar = tk.Scrollbar(left_panel)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    city_listbox = CityListbox(left_panel, yscrollcommand=scrollbar.set)
+    city_listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+    city_listbox.bind("<<ListboxSelect>>", on_city_select)
+
+    scrollbar.config(command=city_listbox.yview)
+
+    # Правая панель - график
+    frame_graph = tk.Frame(main_frame, bg=theme.colors["bg"])
+    frame_graph.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+
+    # Начальное сообщение
+    placeholder_label = tk.Label(frame_graph, text="Выберите город для отображения данных",
+                                 bg=theme.colors["bg"], fg=theme.colors["text_secondary"], font=FONT_TITLE)
+    placeholder_label.pack(pady=50)
+
+    # Панели прогноза и сравнения создаются при первом выборе города
+    forecast_view = None
+    comparison_view = None
+    loading_overlay = None
+
+    # Фоновые задачи (загрузка данных и расчёт прогнозов)
+    task_runner = TaskRunner(root)
+    # Импорт и экспорт файлов идут минутами: у них свой пул, чтобы не занимать потоки прогнозов
+    file_task_runner = TaskRunner(root, name="file_task")
+
+    # Замеры: зависания цикла событий и панель профилирования
+    stall_monitor = profiling.StallMonitor(root)
+    stall_monitor.start()
+    debug_panel = None
+    root.bind("<F12>", show_debug_panel)
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Загрузка данных
+    create_database()
+    update_city_list()
+
+    # Окно и список городов уже готовы; numpy и matplotlib подгружаются в фоне
+    root.after(PRELOAD_DELAY_MS, lambda: task_runner.submit(preload_heavy_modules))
+
+    # Замер времени до появления окна (см. benchmarks/startup.py)
+    if os.environ.get(STARTUP_PROBE_ENV):
+        root.after_idle(report_startup)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
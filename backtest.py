@@ -0,0 +1,117 @@
+# Проверка моделей прогноза на истории (rolling origin): для каждой точки отсчёта
+# модели обучаются на годах до неё и прогнозируют следующие horizon лет.
+# Все города обрабатываются одной матрицей, по одной подгонке на точку отсчёта.
+import time
+
+import numpy as np
+
+from forecasting import MODELS, fit_city
+
+# Минимум лет до первой точки отсчёта и минимум наблюдений города для подгонки
+MIN_TRAIN_YEARS = 3
+MIN_OBSERVATIONS = 2
+BACKTEST_HORIZON = 1
+# Сколько городов берётся для замера задержки прогноза одного города
+LATENCY_SAMPLE = 50
+
+
+class BacktestResult:
+    def __init__(self, model):
+        self.model = model
+        self.forecasts = 0
+        self.mae = np.nan
+        self.rmse = np.nan
+        self.mape = np.nan
+        # Доля фактических цен внутри интервала прогноза (ожидается около INTERVAL_LEVEL)
+        self.coverage = np.nan
+        self.fit_seconds = 0.0
+        self.predict_seconds = 0.0
+        self.latency_ms = np.nan
+
+    def as_dict(self):
+        return {
+            "model": self.model,
+            "forecasts": self.forecasts,
+            "mae": float(self.mae),
+            "rmse": float(self.rmse),
+            "mape": float(self.mape),
+            "coverage": float(self.coverage),
+            "fit_seconds": self.fit_seconds,
+            "predict_seconds": self.predict_seconds,
+            "latency_ms": float(self.latency_ms),
+        }
+
+
+def _rolling_origin(result, fit, years, matrix, horizon, min_train):
+    errors = []
+    relative = []
+    covered = []
+    for origin in range(min_train, len(years)):
+        train = matrix[:, :origin]
+        actual = matrix[:, origin:origin + horizon]
+        rows = ((~np.isnan(train)).sum(axis=1) >= MIN_OBSERVATIONS) & ~np.isnan(actual).all(axis=1)
+        if not rows.any():
+            continue
+
+        started = time.perf_counter()
+        forecast = fit(years[:origin], train[rows])
+        fitted = time.perf_counter()
+        target_years = years[origin:origin + horizon]
+        predicted = forecast.predict(target_years)
+        result.fit_seconds += fitted - started
+        result.predict_seconds += time.perf_counter() - fitted
+        lower, upper = forecast.interval(target_years, predicted)
+
+        error = predicted - actual[rows]
+        known = ~np.isnan(error)
+        errors.append(error[known])
+        bounded = known & ~np.isnan(lower)
+        covered.append((lower[bounded] <= actual[rows][bounded]) & (actual[rows][bounded] <= upper[bounded]))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            relative.append(np.abs(error[known] / actual[rows][known]))
+
+    if errors:
+        errors = np.concatenate(errors)
+        relative = np.concatenate(relative)
+        result.forecasts = len(errors)
+        result.mae = np.abs(errors).mean()
+        result.rmse = np.sqrt((errors ** 2).mean())
+        result.mape = np.nanmean(np.where(np.isfinite(relative), relative, np.nan)) * 100
+        covered = np.concatenate(covered)
+        if len(covered):
+            result.coverage = covered.mean() * 100
+
+
+# Задержка подгонки и прогноза одного города (как при выборе города в интерфейсе), медиана в мс
+def _latency(model, years, matrix, horizon):
+    timings = []
+    for prices in matrix[:LATENCY_SAMPLE]:
+        known = ~np.isnan(prices)
+        if known.sum() < MIN_OBSERVATIONS:
+            continue
+        city_years = years[known]
+        started = time.perf_counter()
+        forecast = fit_city(city_years, prices[known], model)
+        forecast.predict(city_years[-1] + np.arange(1, horizon + 1))
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings)) if timings else np.nan
+
+
+def run_backtest(years, matrix, models=None, horizon=BACKTEST_HORIZON, min_train=MIN_TRAIN_YEARS):
+    years = np.asarray(years)
+    results = []
+    for name in models or MODELS:
+        result = BacktestResult(name)
+        _rolling_origin(result, MODELS[name], years, matrix, horizon, min_train)
+        result.latency_ms = _latency(name, years, matrix, horizon)
+        results.append(result)
+    return results
+
+
+# Самая точная (по MAPE) модель, укладывающаяся в бюджет задержки
+def pick_model(results, budget_ms=None):
+    candidates = [result for result in results
+                  if result.forecasts and (budget_ms is None or result.latency_ms <= budget_ms)]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda result: result.mape)
@@ -0,0 +1,104 @@
+# Замер времени запуска приложения.
+#
+#   python -m benchmarks.startup [--runs 5] [--budget-ms 300] [--out startup.json]
+#
+# 1. python -X importtime -c "import app": суммарное время импорта модуля app
+#    и список тяжёлых библиотек, попавших в sys.modules при импорте.
+# 2. Время до появления окна: запуск app.py с REAL_ESTATE_STARTUP_PROBE=1
+#    (нужен дисплей; без него замер пропускается).
+# Код возврата 1, если при импорте грузятся тяжёлые библиотеки или превышен бюджет.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("numpy", "pandas", "matplotlib", "sklearn", "PIL")
+PROBE_ENV = "REAL_ESTATE_STARTUP_PROBE"
+
+IMPORT_SCRIPT = (
+    "import sys, app; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def parse_importtime(stderr, module):
+    # Формат строк: "import time: self [us] | cumulative | imported package"
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+    raise ValueError(f"Модуль {module} не найден в выводе -X importtime")
+
+
+def measure_import():
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    heavy = [name for name in proc.stdout.strip().split(",") if name]
+    return parse_importtime(proc.stderr, "app"), heavy
+
+
+def measure_window():
+    env = dict(os.environ, **{PROBE_ENV: "1"})
+    started = time.time()
+    proc = subprocess.run([sys.executable, "app.py"], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=60)
+    for line in proc.stdout.splitlines():
+        if line.startswith("window_ready "):
+            return (float(line.split()[1]) - started) * 1000
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер времени запуска приложения")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="допустимая медиана времени импорта app, мс")
+    parser.add_argument("--out", help="сохранить результат в JSON")
+    args = parser.parse_args(argv)
+
+    import_times = []
+    heavy = set()
+    for _ in range(args.runs):
+        elapsed, loaded = measure_import()
+        import_times.append(elapsed)
+        heavy.update(loaded)
+
+    window_times = []
+    for _ in range(args.runs):
+        elapsed = measure_window()
+        if elapsed is None:
+            break
+        window_times.append(elapsed)
+
+    result = {
+        "import_ms": statistics.median(import_times),
+        "import_runs_ms": import_times,
+        "heavy_modules_on_import": sorted(heavy),
+        "window_ms": statistics.median(window_times) if window_times else None,
+        "window_runs_ms": window_times,
+    }
+
+    print(f"Импорт app: {result['import_ms']:.1f} мс (медиана из {args.runs})")
+    if result["window_ms"] is not None:
+        print(f"До появления окна: {result['window_ms']:.1f} мс")
+    else:
+        print("До появления окна: не измерено (нет дисплея)")
+    if heavy:
+        print(f"При импорте загружены тяжёлые модули: {', '.join(sorted(heavy))}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failed = bool(heavy) or (args.budget_ms is not None and result["import_ms"] > args.budget_ms)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+# Набор замеров производительности на синтетических базах разного размера.
+#
+#   python -m benchmarks.suite [--scales 1k,100k,1m] [--repeat 5] [--out results.json]
+#                              [--baseline baseline.json] [--tolerance 0.25] [--workdir DIR]
+#
+# Для каждого размера строится база real_estate.db со случайными (но воспроизводимыми)
+# данными и замеряются: чтение из базы, поиск городов, импорт TXT/JSON, экспорт во все
+# форматы, подгонка моделей прогноза и отрисовка графиков без экрана (Agg).
+# Результат — JSON с медианой и минимумом по каждому замеру. С --baseline результаты
+# сравниваются с сохранённым прогоном; код возврата 1, если что-то замедлилось больше допуска.
+# С --workdir построенные базы сохраняются и переиспользуются между запусками.
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import db
+import exporter
+import importer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCALES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+DEFAULT_SCALES = ("1k", "100k", "1m")
+# Лет истории у города; часть лет пропускается, как в реальных данных
+YEARS_PER_CITY = 20
+FIRST_YEAR = 2005
+MISSING_YEAR_RATE = 0.05
+SEED = 20240101
+# Слоги для названий городов: поиск работает по разнообразным строкам, а не по "Город N"
+SYLLABLES = ("но", "во", "ка", "ра", "ли", "ма", "се", "то", "бо", "ре", "град", "ск", "ин", "ев", "ор")
+
+# Сколько городов берётся для замеров «на один вызов» (выборка данных, прогноз, график)
+SAMPLE_SIZE = 50
+RENDER_SAMPLE_SIZE = 10
+COMPARE_CITIES = 20
+# Изменения меньше этого порога (мс) считаются шумом при сравнении с базовым прогоном
+NOISE_FLOOR_MS = 0.5
+DEFAULT_TOLERANCE = 0.25
+
+
+def city_name(rng, index):
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return f"{name.capitalize()} {index}"
+
+
+# Записи (город, год, цена, описание, ссылка): случайное блуждание цены с ростом
+def synthetic_records(rows, seed=SEED):
+    rng = random.Random(seed)
+    produced = 0
+    index = 0
+    while produced < rows:
+        city = city_name(rng, index)
+        description = f"Синтетический город {index} для замеров"
+        link = f"https://example.org/city/{index}"
+        price = rng.uniform(30000, 300000)
+        growth = rng.uniform(-0.02, 0.12)
+        for year in range(FIRST_YEAR, FIRST_YEAR + YEARS_PER_CITY):
+            price *= 1 + growth + rng.gauss(0, 0.04)
+            if produced and rng.random() < MISSING_YEAR_RATE:
+                continue
+            yield city, year, round(price, 2), description, link
+            produced += 1
+            if produced >= rows:
+                return
+        index += 1
+
+
+def open_database(path):
+    db.configure(path)
+    db.create_database()
+
+
+def build_database(path, rows):
+    if os.path.exists(path):
+        open_database(path)
+        if db.count_records() == rows:
+            return None
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    open_database(path)
+    started = time.perf_counter()
+    importer.import_records(synthetic_records(rows))
+    return (time.perf_counter() - started) * 1000
+
+
+# Замер: repeat запусков fn, время в мс на один вызов (calls вызовов за запуск)
+def measure(fn, repeat, calls=1):
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - started) * 1000 / calls)
+    return {"median_ms": statistics.median(runs), "min_ms": min(runs), "runs_ms": runs}
+
+
+def single(elapsed_ms):
+    return {"median_ms": elapsed_ms, "min_ms": elapsed_ms, "runs_ms": [elapsed_ms]}
+
+
+def bench_queries(results, repeat, sample):
+    results["db.count_cities"] = measure(db.count_cities, repeat)
+    results["db.get_cities"] = measure(db.get_cities, repeat)
+    results["db.get_cities_window"] = measure(lambda: db.get_cities_window(0, 200), repeat)
+    # Страница у конца списка по ключу: время не зависит от позиции, в отличие от OFFSET
+    results["db.get_cities_after"] = measure(lambda: db.get_cities_after(max(sample), 200), repeat)
+    results["db.get_years"] = measure(db.get_years, repeat)
+    results["db.get_city_data"] = measure(lambda: [db.get_city_data(city) for city in sample],
+                                          repeat, calls=len(sample))
+    results["db.get_cities_data"] = measure(lambda: db.get_cities_data(sample[:COMPARE_CITIES]), repeat)
+    results["db.get_city_stats.top"] = measure(
+        lambda: db.get_city_stats(order_by="cagr", descending=True, limit=20), repeat)
+
+
+# Поиск как в filter_cities: индекс строится по всем названиям, запрос уточняется по буквам
+def bench_search(results, repeat, cities, sample):
+    from search import CityIndex
+
+    results["search.build_index"] = measure(lambda: CityIndex(cities), repeat)
+    index = CityIndex(cities)
+    terms = [city[:length].lower() for city in sample[:10] for length in range(1, min(len(city), 8) + 1)]
+
+    results["search.keystroke"] = measure(lambda: [index.search(term) for term in terms],
+                                          repeat, calls=len(terms))
+    # Запросы не продолжают друг друга, поэтому каждый ищется по всему индексу
+    substrings = [city.split()[0][2:5].lower() for city in sample[:10]]
+    results["search.substring"] = measure(lambda: [index.search(term) for term in substrings],
+                                          repeat, calls=len(substrings))
+
+
+def warm_up_parquet(path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pq.write_table(pa.table({"year": [FIRST_YEAR]}), path)
+    os.remove(path)
+
+
+def bench_exports(results, workdir, label):
+    paths = {}
+    formats = ["txt", "json", "ndjson", "csv"]
+    # Parquet — только если установлен pyarrow (необязательная зависимость экспорта)
+    # Разовый импорт и инициализация pyarrow (сотни мс) не должны попадать во время экспорта
+    if importlib.util.find_spec("pyarrow") is not None:
+        warm_up_parquet(os.path.join(workdir, "warm_up.parquet"))
+        formats.append("parquet")
+    for fmt in formats:
+        path = os.path.join(workdir, f"export_{label}.{fmt}")
+        started = time.perf_counter()
+        exporter.export_file(path, fmt=fmt)
+        results[f"export.{fmt}"] = single((time.perf_counter() - started) * 1000)
+        paths[fmt] = path
+    return paths
+
+
+# Импорт как в load_from_txt / load_from_json: файл в пустую базу;
+# import.files — все текстовые выгрузки сразу, как "Импорт файлов" (разбор в процессах)
+def bench_imports(results, workdir, label, paths, db_path):
+    cases = {fmt: lambda fmt=fmt: importer.import_file(paths[fmt]) for fmt in ("txt", "json", "csv")}
+    cases["files"] = lambda: importer.import_files([paths[fmt] for fmt in ("txt", "json", "ndjson", "csv")])
+    for name, run in cases.items():
+        target = os.path.join(workdir, f"import_{label}_{name}.db")
+        open_database(target)
+        started = time.perf_counter()
+        run()
+        results[f"import.{name}"] = single((time.perf_counter() - started) * 1000)
+        # Повторный импорт той же выгрузки: обычная перезапись и запись только изменений
+        if name == "txt":
+            for mode, diff in (("reimport", False), ("reimport_diff", True)):
+                started = time.perf_counter()
+                importer.import_file(paths["txt"], diff=diff)
+                results[f"import.txt.{mode}"] = single((time.perf_counter() - started) * 1000)
+        db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)
+    open_database(db_path)
+
+
+def bench_forecast(results, repeat, sample):
+    from forecasting import MODELS, city_forecast, pivot_prices
+
+    started = time.perf_counter()
+    names, years, matrix = pivot_prices(db.iter_all_prices())
+    results["forecast.pivot_all"] = single((time.perf_counter() - started) * 1000)
+    for name, fit in MODELS.items():
+        results[f"forecast.fit_all.{name}"] = measure(lambda: fit(years, matrix), repeat)
+    city_rows = [db.get_city_data(city) for city in sample]
+    for name in MODELS:
+        results[f"forecast.city.{name}"] = measure(
+            lambda: [city_forecast(rows, 5, name) for rows in city_rows], repeat, calls=len(city_rows))
+
+
+# Отрисовка графиков plot_forecast / show_bar_chart без экрана: шаблоны render.py на холсте Agg
+def bench_render(results, repeat, sample, workdir):
+    import render
+    # Импорт matplotlib не входит в замер: first — создание шаблона графика и первая отрисовка
+    for name in ("charts", "matplotlib.backends.backend_agg"):
+        importlib.import_module(name)
+
+    out_dir = os.path.join(workdir, "charts")
+    os.makedirs(out_dir, exist_ok=True)
+    render._charts.clear()
+    for kind in render.RENDER_KINDS:
+        started = time.perf_counter()
+        render.render_city(sample[0], out_dir, kinds=(kind,))
+        results[f"render.{kind}.first"] = single((time.perf_counter() - started) * 1000)
+        cities = sample[:RENDER_SAMPLE_SIZE]
+        results[f"render.{kind}"] = measure(
+            lambda: [render.render_city(city, out_dir, kinds=(kind,)) for city in cities],
+            repeat, calls=len(cities))
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def run_scale(label, rows, workdir, repeat):
+    results = {}
+    db_path = os.path.join(workdir, f"real_estate_{label}.db")
+    built = build_database(db_path, rows)
+    if built is not None:
+        results["build.import_records"] = single(built)
+
+    cities = db.get_cities()
+    sample = random.Random(SEED).sample(cities, min(SAMPLE_SIZE, len(cities)))
+    bench_queries(results, repeat, sample)
+    bench_search(results, repeat, cities, sample)
+    paths = bench_exports(results, workdir, label)
+    bench_imports(results, workdir, label, paths, db_path)
+    for path in paths.values():
+        os.remove(path)
+    bench_forecast(results, repeat, sample)
+    bench_render(results, repeat, sample, workdir)
+    db.close()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import numpy
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": numpy.__version__,
+    }
+
+
+# Сравнение с базовым прогоном по медианам: (размер, замер, было, стало, отношение, замедление)
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, noise_floor=NOISE_FLOOR_MS):
+    rows = []
+    for label, measures in results.items():
+        for name, current in measures.items():
+            previous = baseline.get(label, {}).get(name)
+            if previous is None:
+                continue
+            before, after = previous["median_ms"], current["median_ms"]
+            ratio = after / before if before else float("inf")
+            regressed = ratio > 1 + tolerance and after - before > noise_floor
+            rows.append((label, name, before, after, ratio, regressed))
+    return rows
+
+
+def parse_scales(value):
+    labels = [label.strip().lower() for label in value.split(",") if label.strip()]
+    unknown = [label for label in labels if label not in SCALES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"неизвестный размер: {', '.join(unknown)} "
+                                         f"(доступны {', '.join(SCALES)})")
+    return labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности на синтетических базах")
+    parser.add_argument("--scales", type=parse_scales, default=list(DEFAULT_SCALES),
+                        help="размеры баз через запятую (по умолчанию 1k,100k,1m)")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого быстрого замера")
+    parser.add_argument("--out", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="допустимое замедление медианы (0.25 = 25%%)")
+    parser.add_argument("--workdir", help="каталог для баз (сохраняется между запусками)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="real_estate_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    results = {}
+    try:
+        for label in args.scales:
+            print(f"[{label}] {SCALES[label]:,} записей", file=sys.stderr, flush=True)
+            results[label] = run_scale(label, SCALES[label], workdir, args.repeat)
+            for name, result in results[label].items():
+                print(f"  {name:<32} {result['median_ms']:>12.3f} мс", file=sys.stderr, flush=True)
+    finally:
+        db.close()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"environment": environment(), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    rows = compare(results, baseline, args.tolerance)
+    print(f"{'размер':<6} {'замер':<32} {'было, мс':>12} {'стало, мс':>12} {'x':>6}")
+    for label, name, before, after, ratio, regressed in rows:
+        mark = "  ЗАМЕДЛЕНИЕ" if regressed else ""
+        print(f"{label:<6} {name:<32} {before:>12.3f} {after:>12.3f} {ratio:>6.2f}{mark}")
+    regressions = sum(row[5] for row in rows)
+    if regressions:
+        print(f"Замедлений больше {args.tolerance:.0%}: {regressions}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
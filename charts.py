@@ -0,0 +1,304 @@
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+
+from theme import theme
+
+# Цвета для графиков
+FORECAST_COLORS = {
+    "historical": theme.colors["accent"],
+    "trend": "#6fa54a",
+    "optimistic": "#a56f4a",
+    "pessimistic": "#a54a6f"
+}
+
+# Цвета городов при сравнении (20 различимых цветов, дальше повторяются)
+COMPARISON_COLORS = colormaps["tab20"]
+
+# Размер точек прогноза: промежуточные годы горизонта и последний год
+FORECAST_POINT_SIZE = 30
+FORECAST_LAST_POINT_SIZE = 100
+
+# Ширина столбца диаграммы (в годах)
+BAR_WIDTH = 0.8
+
+# Радиус подсказки: точка ищется не дальше стольких пикселей от курсора
+HOVER_RADIUS_PX = 10
+
+# Длительность появления каждого слоя анимации, в кадрах
+FADE_FRAMES = 15
+# Сколько кадров максимум отводится на появление исторических точек:
+# при длинной истории за кадр добавляется несколько точек
+MAX_HISTORY_FRAMES = 40
+
+
+# Цена для подписей; интервал без оценки разброса (слишком мало точек) — прочерк
+def format_price(value, spec=".0f"):
+    return "—" if np.isnan(value) else format(value, spec)
+
+
+# Поиск точки под курсором без перебора объектов графика: по каждой серии хранится
+# отсортированный массив x, кандидаты в полосе ±radius пикселей находятся через searchsorted,
+# а в пиксели переводятся только они.
+class PointIndex:
+    def __init__(self):
+        self.keys = []
+        self.xs = []
+        self.ys = []
+
+    # series — (ключ, x, y); точки без значения (NaN) не участвуют
+    def set_series(self, series):
+        self.keys, self.xs, self.ys = [], [], []
+        for key, x, y in series:
+            x = np.asarray(x, dtype=float)
+            y = np.asarray(y, dtype=float)
+            known = ~(np.isnan(x) | np.isnan(y))
+            order = np.argsort(x[known], kind="stable")
+            self.keys.append(key)
+            self.xs.append(x[known][order])
+            self.ys.append(y[known][order])
+
+    # Ближайшая к курсору точка (ключ серии, x, y) или None
+    def nearest(self, ax, event, radius=HOVER_RADIUS_PX):
+        if event.xdata is None or not ax.bbox.width:
+            return None
+        x_min, x_max = ax.get_xlim()
+        band = radius * abs(x_max - x_min) / ax.bbox.width
+        series, candidates = [], []
+        for i, xs in enumerate(self.xs):
+            start, stop = np.searchsorted(xs, (event.xdata - band, event.xdata + band))
+            if start < stop:
+                series.extend([i] * (stop - start))
+                candidates.append(np.column_stack((xs[start:stop], self.ys[i][start:stop])))
+        if not candidates:
+            return None
+        points = np.concatenate(candidates)
+        pixels = ax.transData.transform(points)
+        distances = np.hypot(pixels[:, 0] - event.x, pixels[:, 1] - event.y)
+        best = distances.argmin()
+        if distances[best] > radius:
+            return None
+        return self.keys[series[best]], points[best, 0], points[best, 1]
+
+
+def style_axes(ax, grid_axis="both"):
+    ax.set_facecolor(theme.colors["graph_bg"])
+    for spine in ax.spines.values():
+        spine.set_color(theme.colors["text"])
+    ax.tick_params(colors=theme.colors["text"])
+    ax.grid(True, axis=grid_axis, color=theme.colors["graph_grid"], linestyle='--', alpha=0.5)
+    ax.set_xlabel("Год", fontsize=10, color=theme.colors["text"])
+    ax.set_ylabel("Цена, ₽/м²", fontsize=10, color=theme.colors["text"])
+    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+
+
+# График прогноза: фигура и все линии создаются один раз, при смене города меняются только данные.
+# Figure создаётся без pyplot, поэтому не попадает в глобальный реестр фигур и не утекает.
+class ForecastChart:
+    def __init__(self, figsize=(8, 5), dpi=100):
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor=theme.colors["graph_bg"])
+        self.ax = self.figure.add_subplot(111)
+        style_axes(self.ax)
+        self.years = np.empty(0)
+        self.prices = np.empty(0)
+        self.points = PointIndex()
+
+        ax = self.ax
+        self.historical_line, = ax.plot([], [], 'o-', color=FORECAST_COLORS["historical"],
+                                        label="Исторические данные", linewidth=2, markersize=6)
+        self.trend_line, = ax.plot([], [], '--', color=FORECAST_COLORS["trend"],
+                                   label="Базовый тренд", linewidth=2)
+        self.optimistic_line, = ax.plot([], [], ':', color=FORECAST_COLORS["optimistic"],
+                                        linewidth=2)
+        self.pessimistic_line, = ax.plot([], [], ':', color=FORECAST_COLORS["pessimistic"],
+                                         linewidth=2)
+        self.trend_point = ax.scatter([], [], color=FORECAST_COLORS["trend"], s=FORECAST_LAST_POINT_SIZE)
+        self.optimistic_point = ax.scatter([], [], color=FORECAST_COLORS["optimistic"], s=FORECAST_LAST_POINT_SIZE)
+        self.pessimistic_point = ax.scatter([], [], color=FORECAST_COLORS["pessimistic"], s=FORECAST_LAST_POINT_SIZE)
+
+        self.scenario_lines = (self.optimistic_line, self.pessimistic_line)
+        self.forecast_points = (self.trend_point, self.optimistic_point, self.pessimistic_point)
+        self.animated_artists = (self.historical_line, self.trend_line) + self.scenario_lines + self.forecast_points
+
+    def update(self, city, forecast):
+        self.years = np.asarray(forecast["years"])
+        self.prices = np.asarray(forecast["prices"])
+        year = forecast["forecast_year"]
+        curve_years = forecast["curve_years"]
+        forecast_years = forecast["forecast_years"]
+
+        self.historical_line.set_data(self.years, self.prices)
+        self.trend_line.set_data(curve_years, forecast["trend"])
+        self.optimistic_line.set_data(curve_years, forecast["optimistic"])
+        self.pessimistic_line.set_data(curve_years, forecast["pessimistic"])
+
+        # Точки на каждый год горизонта, последняя крупнее
+        sizes = [FORECAST_POINT_SIZE] * (len(forecast_years) - 1) + [FORECAST_LAST_POINT_SIZE]
+        for point, values in ((self.trend_point, forecast["forecast_prices"]),
+                              (self.optimistic_point, forecast["forecast_optimistic"]),
+                              (self.pessimistic_point, forecast["forecast_pessimistic"])):
+            point.set_offsets(np.column_stack((forecast_years, values)))
+            point.set_sizes(sizes)
+        level = f"{forecast['level']:.0%}"
+        self.optimistic_line.set_label(f"Оптимистичный (верхняя граница {level})")
+        self.pessimistic_line.set_label(f"Пессимистичный (нижняя граница {level})")
+        # Прогнозные точки лежат на линиях тренда и сценариев, отдельные серии им не нужны
+        self.points.set_series((
+            ("historical", self.years, self.prices),
+            ("trend", curve_years, forecast["trend"]),
+            ("optimistic", curve_years, forecast["optimistic"]),
+            ("pessimistic", curve_years, forecast["pessimistic"]),
+        ))
+        self.trend_point.set_label(f"{year}: {format_price(forecast['predicted_price'])} ₽/м²")
+        self.optimistic_point.set_label(f"{year}, оптимистичный: {format_price(forecast['optimistic_price'])} ₽/м²")
+        self.pessimistic_point.set_label(f"{year}, пессимистичный: {format_price(forecast['pessimistic_price'])} ₽/м²")
+
+        self.ax.set_title(f"Динамика цен в {city}", fontsize=12, color=theme.colors["text"], pad=10)
+
+        # Легенда копирует прозрачность линий, поэтому строится по полностью показанному графику
+        self.show_all()
+
+        # Линии тренда доходят до конца горизонта, поэтому пределы осей покрывают и точки прогноза
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+        self.ax.legend(facecolor=theme.colors["graph_bg"], edgecolor='none',
+                       labelcolor=theme.colors["text"],
+                       bbox_to_anchor=(0.5, -0.25),
+                       loc='upper center',
+                       ncol=2,
+                       fontsize=9)
+
+    @property
+    def history_frames(self):
+        return min(len(self.years), MAX_HISTORY_FRAMES)
+
+    @property
+    def frame_count(self):
+        return self.history_frames + 3 * FADE_FRAMES
+
+    # Кадр анимации: исторические точки появляются по очереди, затем плавно тренд, сценарии и прогноз.
+    # Меняются только данные и прозрачность уже созданных линий.
+    def draw_frame(self, i):
+        n = len(self.years)
+        steps = self.history_frames
+        shown = n if i >= steps else -(-(i + 1) * n // steps)
+        self.historical_line.set_data(self.years[:shown], self.prices[:shown])
+        self._fade(self.trend_line, i - steps + 1)
+        for line in self.scenario_lines:
+            self._fade(line, i - steps - FADE_FRAMES + 1)
+        for point in self.forecast_points:
+            self._fade(point, i - steps - 2 * FADE_FRAMES + 1)
+
+    def show_all(self):
+        self.draw_frame(self.frame_count)
+
+    # Анимируемые линии исключаются из обычной отрисовки и рисуются поверх сохранённого фона
+    def set_animated(self, animated):
+        for artist in self.animated_artists:
+            artist.set_animated(animated)
+
+    def draw_animated(self):
+        for artist in self.animated_artists:
+            if artist.get_visible():
+                self.ax.draw_artist(artist)
+
+    @staticmethod
+    def _fade(artist, step):
+        progress = min(1, max(0, step / FADE_FRAMES))
+        artist.set_visible(progress > 0)
+        artist.set_alpha(progress)
+
+
+# Столбчатая диаграмма цен по годам: фигура и оформление создаются один раз,
+# при смене города заменяются только столбцы
+class BarChart:
+    def __init__(self, figsize=(8, 5), dpi=100):
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor=theme.colors["graph_bg"])
+        self.ax = self.figure.add_subplot(111)
+        style_axes(self.ax, grid_axis='y')
+        self.bars = None
+        self.centers = np.empty(0)
+        self.heights = np.empty(0)
+
+    def update(self, city, years, prices):
+        if self.bars is not None:
+            self.bars.remove()
+        self.bars = self.ax.bar(years, prices, color=theme.colors["accent"], width=BAR_WIDTH)
+        order = np.argsort(np.asarray(years, dtype=float), kind="stable")
+        self.centers = np.asarray(years, dtype=float)[order]
+        self.heights = np.asarray(prices, dtype=float)[order]
+        self.ax.set_title(f"Цены за м² в {city}", fontsize=12, color=theme.colors["text"])
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    # Столбец под точкой (x, y) в координатах данных: ближайший центр через searchsorted
+    def bar_at(self, x, y):
+        if x is None or y is None or not len(self.centers):
+            return None
+        i = np.searchsorted(self.centers, x)
+        for j in (i - 1, i):
+            if 0 <= j < len(self.centers) and abs(x - self.centers[j]) <= BAR_WIDTH / 2:
+                height = self.heights[j]
+                if min(0, height) <= y <= max(0, height):
+                    return self.centers[j], height
+        return None
+
+
+# Сравнение городов на общих осях: у каждого города история (сплошная линия)
+# и прогноз от последнего наблюдения (пунктир) одного цвета.
+# Линии создаются по мере надобности и переиспользуются, лишние скрываются.
+class ComparisonChart:
+    def __init__(self, figsize=(8, 5), dpi=100):
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor=theme.colors["graph_bg"])
+        self.ax = self.figure.add_subplot(111)
+        style_axes(self.ax)
+        self.names = []
+        self.history_lines = []
+        self.forecast_lines = []
+        self.points = PointIndex()
+
+    def _lines(self, count):
+        while len(self.history_lines) < count:
+            color = COMPARISON_COLORS(len(self.history_lines) % COMPARISON_COLORS.N)
+            history, = self.ax.plot([], [], 'o-', color=color, linewidth=2, markersize=4)
+            forecast, = self.ax.plot([], [], 'o--', color=color, linewidth=1.5, markersize=4)
+            self.history_lines.append(history)
+            self.forecast_lines.append(forecast)
+
+    def update(self, comparison):
+        names = comparison["names"]
+        years = comparison["years"]
+        self.names = names
+        self._lines(len(names))
+        series = []
+
+        for i, (history, forecast) in enumerate(zip(self.history_lines, self.forecast_lines)):
+            visible = i < len(names)
+            history.set_visible(visible)
+            forecast.set_visible(visible)
+            if not visible:
+                history.set_label("_hidden")
+                forecast.set_label("_hidden")
+                continue
+            prices = comparison["prices"][i]
+            observed = ~np.isnan(prices)
+            history.set_data(years[observed], prices[observed])
+            history.set_label(names[i])
+            forecast.set_data(np.append(comparison["last_years"][i], comparison["forecast_years"][i]),
+                              np.append(comparison["last_prices"][i], comparison["forecast_prices"][i]))
+            forecast.set_label("_forecast")
+            series.append(((i, "history"), years[observed], prices[observed]))
+            series.append(((i, "forecast"), comparison["forecast_years"][i], comparison["forecast_prices"][i]))
+        self.points.set_series(series)
+
+        self.ax.set_title(f"Сравнение городов: {len(names)}", fontsize=12, color=theme.colors["text"], pad=10)
+        self.ax.relim(visible_only=True)
+        self.ax.autoscale_view()
+        self.ax.legend(facecolor=theme.colors["graph_bg"], edgecolor='none',
+                       labelcolor=theme.colors["text"],
+                       bbox_to_anchor=(0.5, -0.15),
+                       loc='upper center',
+                       ncol=min(4, max(1, len(names))),
+                       fontsize=8)
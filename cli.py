@@ -0,0 +1,298 @@
+# Запуск без графического интерфейса (сервер, ночные задания):
+#
+#   python -m cli import data.txt more.json
+#   python -m cli import regions/ --workers 4 --diff
+#   python -m cli export dump.csv
+#   python -m cli forecast --all --horizon 5 --out report.csv
+#   python -m cli backtest --horizon 2 --budget-ms 5
+#   python -m cli stats --sort cagr --desc --limit 20
+#   python -m cli render --all --out-dir charts --format svg --kind forecast
+#   python -m cli --profile-out import.json import data.txt
+#
+# Модуль не импортирует tkinter и работает на машине без дисплея.
+import argparse
+import csv
+import os
+import sys
+
+import db
+
+# Имена моделей из forecasting.MODELS (без импорта numpy ради разбора аргументов)
+MODEL_NAMES = ("linear", "loglinear", "holt", "robust")
+
+# Отчёт прогноза: по строке на каждый год горизонта каждого города
+REPORT_HEADER = ("city", "first_year", "last_year", "last_price", "forecast_year",
+                 "predicted_price", "optimistic_price", "pessimistic_price")
+
+# Поля сводки city_stats (db.CITY_STATS_COLUMNS)
+STATS_HEADER = ("city", "observations", "first_year", "first_price", "last_year", "last_price",
+                "slope", "intercept", "cagr", "forecast_price")
+
+
+def print_progress(text):
+    print(f"\r{text}", end="", file=sys.stderr, flush=True)
+
+
+def cmd_import(args):
+    import importer
+
+    if len(args.files) > 1 or any(os.path.isdir(path) for path in args.files):
+        import_many(importer, args)
+        return
+    path = args.files[0]
+    result = importer.import_file(
+        path, diff=args.diff,
+        progress=lambda records, bytes_read, total: print_progress(f"{path}: {records:,}"))
+    print_progress(f"{path}: записей {result.records:,}, городов {len(result.cities):,}"
+                   f"{format_diff(result, args)}\n")
+
+
+# Итог сравнения с базой при --diff
+def format_diff(result, args):
+    if not args.diff:
+        return ""
+    return f", новых {result.new:,}, изменено {result.updated:,}, без изменений {result.unchanged:,}"
+
+
+# Несколько файлов: разбор в процессах, сводка по каждому файлу
+def import_many(importer, args):
+    results = importer.import_files(
+        args.files, workers=args.workers, diff=args.diff,
+        progress=lambda records, bytes_read, total: print_progress(
+            f"записей {records:,}, прочитано {bytes_read / total if total else 1:.0%}"))
+    print_progress("\n")
+    for result in results:
+        print(f"{result.path}: записей {result.records:,}, новых городов {len(result.new_cities):,}, "
+              f"отклонено {result.rejected.count:,}{format_diff(result, args)}")
+        for message in result.rejected.messages:
+            print(f"  {message}")
+        if result.error:
+            print(f"  Ошибка: {result.error}")
+    failed = sum(1 for result in results if result.error)
+    if failed:
+        raise ValueError(f"Не удалось полностью разобрать файлов: {failed}")
+
+
+def cmd_export(args):
+    import exporter
+
+    result = exporter.export_file(
+        args.file, fmt=args.format,
+        progress=lambda records, total: print_progress(f"{records:,} / {total:,}"))
+    print_progress(f"{args.file}: записей {result.records:,}\n")
+
+
+def select_cities(args):
+    if args.all:
+        return db.get_cities()
+    missing = [city for city in args.city if not db.get_city_data(city)]
+    if missing:
+        raise ValueError(f"Нет данных для городов: {', '.join(missing)}")
+    return args.city
+
+
+# Прогноз по всем городам сразу: одна выборка цен и пакетная подгонка трендов
+def cmd_forecast(args):
+    from forecasting import pivot_prices
+
+    names, years, matrix = pivot_prices(db.iter_all_prices())
+    if not args.all:
+        index = {name: i for i, name in enumerate(names)}
+        missing = [city for city in args.city if city not in index]
+        if missing:
+            raise ValueError(f"Нет данных для городов: {', '.join(missing)}")
+        names = list(args.city)
+        matrix = matrix[[index[city] for city in names]]
+
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(REPORT_HEADER)
+        if names:
+            write_forecast_rows(writer, names, years, matrix, args.horizon, args.model)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def write_forecast_rows(writer, names, years, matrix, horizon, model):
+    import numpy as np
+    from forecasting import get_model, horizon_years, observed_bounds
+
+    first, last = observed_bounds(matrix)
+    last_prices = matrix[np.arange(len(names)), last]
+
+    # Годы горизонта у каждого города свои (от его последнего наблюдения): матрица города × горизонт
+    forecast = get_model(model)(years, matrix)
+    forecast_years = horizon_years(years[last], horizon)
+    predicted = forecast.predict(forecast_years)
+    lower, upper = forecast.interval(forecast_years, predicted)
+
+    for i, name in enumerate(names):
+        for year, price, optimistic, pessimistic in zip(forecast_years[i], predicted[i], upper[i], lower[i]):
+            writer.writerow((name, years[first[i]], years[last[i]], f"{last_prices[i]:.2f}", year,
+                             f"{price:.2f}", format_bound(optimistic), format_bound(pessimistic)))
+
+
+# Граница интервала; без оценки разброса (мало точек) поле остаётся пустым
+def format_bound(value):
+    return "" if value != value else f"{value:.2f}"
+
+
+def cmd_render(args):
+    import render
+
+    cities = select_cities(args)
+    paths = render.render_all(cities, args.out_dir, fmt=args.format,
+                              kinds=args.kind or render.RENDER_KINDS, horizon=args.horizon,
+                              model=args.model, workers=args.workers,
+                              progress=lambda done, total: print_progress(f"{done:,} / {total:,}"))
+    print_progress(f"Сохранено графиков: {len(paths):,} в {args.out_dir}\n")
+
+
+# Рейтинг городов по готовой сводке city_stats, без подгонки трендов
+def cmd_stats(args):
+    rows = db.get_city_stats(args.city, order_by=args.sort, descending=args.desc, limit=args.limit)
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(STATS_HEADER)
+        writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+# Проверка моделей на истории: точность и время по каждой модели
+def cmd_backtest(args):
+    import json
+    from backtest import pick_model, run_backtest
+    from forecasting import pivot_prices
+
+    names, years, matrix = pivot_prices(db.iter_all_prices())
+    results = run_backtest(years, matrix, models=args.model, horizon=args.horizon,
+                           min_train=args.min_train)
+
+    print(f"{'модель':<10} {'прогнозов':>10} {'MAPE, %':>8} {'MAE':>12} {'RMSE':>12} {'покрытие, %':>12} "
+          f"{'подгонка, с':>12} {'прогноз, с':>11} {'город, мс':>10}")
+    for result in results:
+        print(f"{result.model:<10} {result.forecasts:>10,} {result.mape:>8.2f} {result.mae:>12.1f} "
+              f"{result.rmse:>12.1f} {result.coverage:>12.1f} {result.fit_seconds:>12.4f} "
+              f"{result.predict_seconds:>11.4f} {result.latency_ms:>10.3f}")
+
+    best = pick_model(results, args.budget_ms)
+    if best is None:
+        print("Нет модели, укладывающейся в бюджет задержки")
+    else:
+        print(f"Рекомендуемая модель: {best.model}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"cities": len(names), "horizon": args.horizon,
+                       "results": [result.as_dict() for result in results],
+                       "best": best.model if best else None}, f, ensure_ascii=False, indent=2)
+
+
+def add_city_selection(parser):
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--all", action="store_true", help="все города")
+    group.add_argument("--city", action="append", help="город (можно указать несколько раз)")
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("значение должно быть не меньше 1")
+    return number
+
+
+def add_horizon(parser):
+    parser.add_argument("--horizon", type=positive_int, default=1,
+                        help="на сколько лет вперёд от последнего наблюдения (по умолчанию 1)")
+
+
+def add_model(parser):
+    parser.add_argument("--model", choices=MODEL_NAMES, default="linear",
+                        help="модель прогноза (по умолчанию linear)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli", description="Прогноз цен на недвижимость без интерфейса")
+    parser.add_argument("--db", default=db.DB_PATH, help="путь к базе данных")
+    parser.add_argument("--profile-out", help="сохранить время этапов (profiling) в JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_import = commands.add_parser("import", help="загрузить данные из TXT/JSON/NDJSON/CSV")
+    parser_import.add_argument("files", nargs="+", help="файлы или папки")
+    parser_import.add_argument("--workers", type=positive_int,
+                               help="процессов разбора для нескольких файлов (по умолчанию по числу ядер)")
+    parser_import.add_argument("--diff", action="store_true",
+                               help="записывать только новые и изменившиеся цены и вывести итог сравнения")
+    parser_import.set_defaults(handler=cmd_import)
+
+    parser_export = commands.add_parser("export", help="выгрузить базу в файл")
+    parser_export.add_argument("file")
+    parser_export.add_argument("--format", choices=("txt", "json", "ndjson", "csv", "parquet"),
+                               help="по умолчанию определяется по расширению")
+    parser_export.set_defaults(handler=cmd_export)
+
+    parser_forecast = commands.add_parser("forecast", help="прогноз цен в CSV")
+    add_city_selection(parser_forecast)
+    add_horizon(parser_forecast)
+    add_model(parser_forecast)
+    parser_forecast.add_argument("--out", help="файл отчёта (по умолчанию stdout)")
+    parser_forecast.set_defaults(handler=cmd_forecast)
+
+    parser_render = commands.add_parser("render", help="графики прогноза и диаграммы цен в PNG/SVG")
+    add_city_selection(parser_render)
+    parser_render.add_argument("--out-dir", default="charts")
+    parser_render.add_argument("--format", choices=("png", "svg"), default="png")
+    add_horizon(parser_render)
+    add_model(parser_render)
+    parser_render.add_argument("--kind", action="append", choices=("forecast", "bar"),
+                               help="тип графика (по умолчанию оба)")
+    parser_render.add_argument("--workers", type=positive_int, help="число процессов (по умолчанию по числу ядер)")
+    parser_render.set_defaults(handler=cmd_render)
+
+    parser_stats = commands.add_parser("stats", help="сводка по городам: последняя цена, тренд, CAGR")
+    parser_stats.add_argument("--city", action="append", help="город (по умолчанию все)")
+    parser_stats.add_argument("--sort", choices=db.CITY_STATS_COLUMNS, default="name",
+                              help="поле сортировки (по умолчанию name)")
+    parser_stats.add_argument("--desc", action="store_true", help="по убыванию")
+    parser_stats.add_argument("--limit", type=positive_int)
+    parser_stats.add_argument("--out", help="файл отчёта (по умолчанию stdout)")
+    parser_stats.set_defaults(handler=cmd_stats)
+
+    parser_backtest = commands.add_parser("backtest", help="проверка моделей прогноза на истории")
+    add_horizon(parser_backtest)
+    parser_backtest.add_argument("--model", action="append", choices=MODEL_NAMES,
+                                 help="модель (можно указать несколько раз, по умолчанию все)")
+    parser_backtest.add_argument("--min-train", type=positive_int, default=3,
+                                 help="минимум лет истории до первой точки отсчёта")
+    parser_backtest.add_argument("--budget-ms", type=float,
+                                 help="допустимая задержка прогноза одного города, мс")
+    parser_backtest.add_argument("--out", help="сохранить результат в JSON")
+    parser_backtest.set_defaults(handler=cmd_backtest)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db.configure(args.db)
+    try:
+        db.create_database()
+        args.handler(args)
+    except Exception as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close()
+        if args.profile_out:
+            import profiling
+
+            profiling.dump(args.profile_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
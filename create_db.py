@@ -1,26 +1,10 @@
-import sqlite3
+import db
 
-# Подключение к базе данных (если не существует, она будет создана)
-conn = sqlite3.connect('real_estate.db')
-cursor = conn.cursor()
-
-# Создание таблицы
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS prices (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        city TEXT NOT NULL,
-        year INTEGER NOT NULL,
-        average_price REAL NOT NULL,
-        description TEXT,
-        wiki_link TEXT
-    );
-''')
+# Создание (или миграция) базы данных по актуальной схеме
+db.create_database()
 
 # Вставка данных
-cursor.executemany('''
-    INSERT INTO prices (city, year, average_price, description, wiki_link) 
-    VALUES (?, ?, ?, ?, ?);
-''', [
+db.insert_records([
     ('Калининград', 2020, 55000, 'Калининград — город в России, административный центр Калининградской области.', 'https://ru.wikipedia.org/wiki/Калининград'),
     ('Калининград', 2021, 60000, 'Калининград — город с богатой историей и архитектурой.', 'https://ru.wikipedia.org/wiki/Калининград'),
     ('Калининград', 2022, 65000, 'Калининград известен своими пляжами и морским климатом.', 'https://ru.wikipedia.org/wiki/Калининград'),
@@ -36,8 +20,6 @@ cursor.executemany('''
     # Добавьте другие города по аналогии
 ])
 
-# Подтверждаем изменения и закрываем соединение
-conn.commit()
-conn.close()
+db.close()
 
 print("База данных создана и данные вставлены!")
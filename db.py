@@ -0,0 +1,394 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import profiling
+import schema
+
+DB_PATH = "real_estate.db"
+
+# Настройки соединения: WAL позволяет читать из рабочих потоков во время записи,
+# synchronous=NORMAL в режиме WAL безопасен и заметно ускоряет коммиты
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Размер кэша подготовленных выражений sqlite3 (на соединение)
+STATEMENT_CACHE_SIZE = 256
+
+
+# Запись не началась: блокировку записи держит другой поток (например, фоновый импорт)
+class DatabaseBusy(Exception):
+    pass
+
+
+# Пул соединений: одно долгоживущее соединение на поток
+class ConnectionPool:
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # SQLite допускает только одного писателя, сериализуем запись внутри процесса
+        self.write_lock = threading.RLock()
+        self._changed = set()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.create_function("growth_rate", 3, schema.growth_rate, deterministic=True)
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    # timeout — сколько секунд ждать блокировку записи (None — без ограничения), затем DatabaseBusy
+    @contextmanager
+    def transaction(self, timeout=None):
+        conn = self.connection()
+        if not self.write_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise DatabaseBusy("База данных занята другой записью, повторите позже")
+        try:
+            if conn.in_transaction:
+                # Вложенный вызов: работаем внутри уже открытой транзакции
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                # Сводка и версии данных изменённых городов обновляются в той же транзакции
+                if self._changed:
+                    with profiling.span("db.refresh_city_stats"):
+                        refresh_city_stats(conn, self._changed)
+                    bump_city_versions(conn, self._changed)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                self._changed.clear()
+                raise
+            else:
+                with profiling.span("db.commit"):
+                    conn.execute("COMMIT")
+                self._changed.clear()
+        finally:
+            self.write_lock.release()
+
+    # Отметить города, изменённые в текущей транзакции (вызывается под write_lock)
+    def mark_changed(self, cities):
+        self._changed.update(cities)
+
+    def close_all(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Соединение принадлежит другому потоку, закроется вместе с ним
+                pass
+        self._local = threading.local()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def configure(path):
+    global _pool, DB_PATH
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        DB_PATH = path
+        _pool = ConnectionPool(path)
+    return _pool
+
+
+def get_connection():
+    return get_pool().connection()
+
+
+def transaction(timeout=None):
+    return get_pool().transaction(timeout)
+
+
+# Версия данных города для ключей кэша (None — города нет). Читается из базы,
+# поэтому учитывает и запись из других процессов
+def data_version(city):
+    row = get_connection().execute(SQL_CITY_VERSION, (city,)).fetchone()
+    return row[0] if row else None
+
+
+def close():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
+# Запросы
+SQL_CITIES = "SELECT name FROM cities ORDER BY name"
+SQL_COUNT_CITIES = "SELECT count(*) FROM cities"
+SQL_COUNT_RECORDS = "SELECT count(*) FROM prices"
+# Страница списка городов. OFFSET пропускает строки по одной, поэтому соседние страницы
+# берутся по ключу — от последнего (или первого) названия уже загруженной страницы
+SQL_CITIES_WINDOW = "SELECT name FROM cities ORDER BY name LIMIT ? OFFSET ?"
+SQL_CITIES_AFTER = "SELECT name FROM cities WHERE name > ? ORDER BY name LIMIT ?"
+SQL_CITIES_BEFORE = "SELECT name FROM cities WHERE name < ? ORDER BY name DESC LIMIT ?"
+SQL_CITY_DATA = """
+    SELECT p.year, p.price FROM cities AS c JOIN prices AS p ON p.city_id = c.id
+    WHERE c.name = ? ORDER BY p.year
+"""
+# Различные годы по индексу prices_year: каждый следующий год — поиск по индексу
+SQL_YEARS = """
+    WITH RECURSIVE y(year) AS (
+        SELECT min(year) FROM prices
+        UNION ALL
+        SELECT (SELECT min(year) FROM prices WHERE year > y.year) FROM y WHERE y.year IS NOT NULL
+    )
+    SELECT year FROM y WHERE year IS NOT NULL
+"""
+SQL_CITY_INFO = "SELECT description, wiki_link FROM cities WHERE name = ?"
+SQL_CITY_VERSION = "SELECT version FROM cities WHERE name = ?"
+# Описание и ссылка города берутся из последней записи (как прежний INSERT OR REPLACE);
+# совпадающие значения не перезаписываются
+SQL_UPSERT_CITY = """
+    INSERT INTO cities (name, description, wiki_link) VALUES (?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET description = excluded.description, wiki_link = excluded.wiki_link
+    WHERE description IS NOT excluded.description OR wiki_link IS NOT excluded.wiki_link
+"""
+SQL_UPSERT_PRICE = """
+    INSERT INTO prices (city_id, year, price) VALUES ((SELECT id FROM cities WHERE name = ?), ?, ?)
+    ON CONFLICT (city_id, year) DO UPDATE SET price = excluded.price
+"""
+# Импорт с поиском изменений: пачка сначала кладётся во временную таблицу (в памяти, temp_store),
+# затем одним соединением с prices определяется, какие цены новые или изменились, и пишутся только они
+SQL_CREATE_IMPORT_STAGE = """
+    CREATE TEMP TABLE IF NOT EXISTS import_stage (
+        city TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (city, year)
+    ) WITHOUT ROWID
+"""
+SQL_CLEAR_IMPORT_STAGE = "DELETE FROM import_stage"
+# Повтор (город, год) в пачке: как и при обычном импорте, побеждает последняя цена
+SQL_STAGE_PRICE = """
+    INSERT INTO import_stage (city, year, price) VALUES (?, ?, ?)
+    ON CONFLICT (city, year) DO UPDATE SET price = excluded.price
+"""
+SQL_COUNT_IMPORT_STAGE = "SELECT count(*) FROM import_stage"
+SQL_STAGE_CHANGES_FROM = """
+    FROM import_stage AS s
+    JOIN cities AS c ON c.name = s.city
+    LEFT JOIN prices AS p ON p.city_id = c.id AND p.year = s.year
+    WHERE p.price IS NULL OR p.price <> s.price
+"""
+# По городам: сколько цен новых, сколько изменилось
+SQL_STAGE_CHANGES = f"""
+    SELECT s.city, count(*) FILTER (WHERE p.price IS NULL), count(*) FILTER (WHERE p.price IS NOT NULL)
+    {SQL_STAGE_CHANGES_FROM}
+    GROUP BY s.city
+"""
+SQL_WRITE_STAGE_CHANGES = f"""
+    INSERT INTO prices (city_id, year, price)
+    SELECT c.id, s.year, s.price
+    {SQL_STAGE_CHANGES_FROM}
+    ON CONFLICT (city_id, year) DO UPDATE SET price = excluded.price
+"""
+SQL_DELETE_CITY = "DELETE FROM cities WHERE name = ?"
+SQL_ALL_PRICES = """
+    SELECT c.name, p.year, p.price
+    FROM cities AS c JOIN prices AS p ON p.city_id = c.id
+    ORDER BY c.name, p.year
+"""
+# Отбор городов по списку имён, переданному одним JSON-параметром
+SQL_CITY_IDS = "SELECT id FROM cities WHERE name IN (SELECT value FROM json_each(?))"
+SQL_CITIES_INFO = f"SELECT name, description, wiki_link FROM cities WHERE id IN ({SQL_CITY_IDS})"
+SQL_BUMP_DATA_GENERATION = "UPDATE data_generation SET value = value + 1 RETURNING value"
+SQL_SET_CITY_VERSIONS = f"UPDATE cities SET version = ? WHERE id IN ({SQL_CITY_IDS})"
+# Цены нескольких городов одним запросом (для сравнения)
+SQL_CITIES_DATA = f"""
+    SELECT c.name, p.year, p.price FROM cities AS c JOIN prices AS p ON p.city_id = c.id
+    WHERE c.id IN ({SQL_CITY_IDS}) ORDER BY c.name, p.year
+"""
+SQL_REFRESH_CITY_STATS = schema.INSERT_CITY_STATS.format(where=f"WHERE city_id IN ({SQL_CITY_IDS})")
+SQL_CITY_STATS = """
+    SELECT c.name, s.observations, s.first_year, s.first_price, s.last_year, s.last_price,
+           s.slope, s.intercept, s.cagr, s.forecast_price
+    FROM city_stats AS s JOIN cities AS c ON c.id = s.city_id
+"""
+# Поля сводки, по которым можно сортировать (вместе с именем города)
+CITY_STATS_COLUMNS = ("name", "observations", "first_year", "first_price", "last_year", "last_price",
+                      "slope", "intercept", "cagr", "forecast_price")
+SQL_ALL_RECORDS = """
+    SELECT c.name, p.year, p.price, c.description, c.wiki_link
+    FROM cities AS c JOIN prices AS p ON p.city_id = c.id
+    ORDER BY c.name, p.year
+"""
+
+
+# Функции для работы с базой данных
+def create_database():
+    schema.migrate(get_pool())
+
+
+def get_cities():
+    return [row[0] for row in get_connection().execute(SQL_CITIES)]
+
+
+def count_cities():
+    return get_connection().execute(SQL_COUNT_CITIES).fetchone()[0]
+
+
+def get_cities_window(offset, limit):
+    return [row[0] for row in get_connection().execute(SQL_CITIES_WINDOW, (limit, offset))]
+
+
+# limit названий сразу после name (по алфавиту)
+def get_cities_after(name, limit):
+    return [row[0] for row in get_connection().execute(SQL_CITIES_AFTER, (name, limit))]
+
+
+# limit названий сразу перед name, по алфавиту
+def get_cities_before(name, limit):
+    return [row[0] for row in get_connection().execute(SQL_CITIES_BEFORE, (name, limit))][::-1]
+
+
+def get_city_data(city):
+    return get_connection().execute(SQL_CITY_DATA, (city,)).fetchall()
+
+
+# Строки (город, год, цена) для списка городов
+def get_cities_data(cities):
+    return get_connection().execute(SQL_CITIES_DATA, (json.dumps(list(cities), ensure_ascii=False),)).fetchall()
+
+
+def get_years():
+    return [row[0] for row in get_connection().execute(SQL_YEARS)]
+
+
+def get_city_info(city):
+    city_info = get_connection().execute(SQL_CITY_INFO, (city,)).fetchone()
+    return city_info if city_info else ("Описание отсутствует", "")
+
+
+def add_city(city, prices, description, wiki_link, timeout=None):
+    pool = get_pool()
+    with pool.transaction(timeout) as conn:
+        conn.execute(SQL_UPSERT_CITY, (city, description, wiki_link))
+        conn.executemany(SQL_UPSERT_PRICE, ((city, year, price) for year, price in prices))
+        pool.mark_changed((city,))
+
+
+def delete_city(city, timeout=None):
+    pool = get_pool()
+    with pool.transaction(timeout) as conn:
+        conn.execute(SQL_DELETE_CITY, (city,))
+        pool.mark_changed((city,))
+
+
+# Запись пачки записей (город, год, цена, описание, ссылка) в открытой транзакции
+def write_records(conn, records):
+    cities = {record[0]: (record[0], record[3], record[4]) for record in records}
+    conn.executemany(SQL_UPSERT_CITY, cities.values())
+    conn.executemany(SQL_UPSERT_PRICE, ((record[0], record[1], record[2]) for record in records))
+    get_pool().mark_changed(cities)
+
+
+# То же, но с записью только новых и изменившихся цен: неизменные строки не трогают страницы
+# и индексы, а сводка city_stats и версии кэша обновляются только у изменившихся городов.
+# Возвращает (новых, изменено, без изменений) для различных (город, год) пачки.
+def write_changed_records(conn, records):
+    cities = {record[0]: (record[0], record[3], record[4]) for record in records}
+    # Смена описания или ссылки тоже меняет данные города (их хранит кэш прогноза)
+    known = conn.execute(SQL_CITIES_INFO, (json.dumps(list(cities), ensure_ascii=False),)).fetchall()
+    get_pool().mark_changed(name for name, description, wiki_link in known
+                            if cities[name] != (name, description, wiki_link))
+    conn.executemany(SQL_UPSERT_CITY, cities.values())
+
+    conn.execute(SQL_CREATE_IMPORT_STAGE)
+    conn.execute(SQL_CLEAR_IMPORT_STAGE)
+    conn.executemany(SQL_STAGE_PRICE, ((record[0], record[1], record[2]) for record in records))
+    staged = conn.execute(SQL_COUNT_IMPORT_STAGE).fetchone()[0]
+    changes = conn.execute(SQL_STAGE_CHANGES).fetchall()
+    new = sum(row[1] for row in changes)
+    updated = sum(row[2] for row in changes)
+    if changes:
+        conn.execute(SQL_WRITE_STAGE_CHANGES)
+        get_pool().mark_changed(row[0] for row in changes)
+    return new, updated, staged - new - updated
+
+
+def insert_records(records):
+    with transaction() as conn:
+        write_records(conn, records)
+
+
+def count_records():
+    return get_connection().execute(SQL_COUNT_RECORDS).fetchone()[0]
+
+
+# Все записи (город, год, цена, описание, ссылка) курсором, для потокового экспорта
+def iter_all_records():
+    return get_connection().execute(SQL_ALL_RECORDS)
+
+
+# Все цены (город, год, цена) для пакетного прогноза, без загрузки в список
+def iter_all_prices():
+    return get_connection().execute(SQL_ALL_PRICES)
+
+
+# Пересчёт сводки city_stats для городов (вызывается в открытой транзакции записи).
+# Удалённые города исчезают из сводки каскадно, цены у существующих только добавляются,
+# поэтому достаточно перезаписать строки изменённых городов.
+def refresh_city_stats(conn, cities):
+    conn.execute(SQL_REFRESH_CITY_STATS, (json.dumps(list(cities), ensure_ascii=False),))
+
+
+# Новая версия данных для городов (вызывается в открытой транзакции записи)
+def bump_city_versions(conn, cities):
+    generation = conn.execute(SQL_BUMP_DATA_GENERATION).fetchone()[0]
+    conn.execute(SQL_SET_CITY_VERSIONS, (generation, json.dumps(list(cities), ensure_ascii=False)))
+
+
+# Сводка по городам (имя, число наблюдений, первый год и цена, последний год и цена, наклон,
+# свободный член, CAGR, прогноз на следующий год) без пересчёта трендов.
+# cities — только эти города; order_by — поле из CITY_STATS_COLUMNS; NULL (нет CAGR) — в конце.
+def get_city_stats(cities=None, order_by="name", descending=False, limit=None):
+    if order_by not in CITY_STATS_COLUMNS:
+        raise ValueError(f"Неизвестное поле сводки: {order_by}")
+    column = "c.name" if order_by == "name" else f"s.{order_by}"
+    sql = SQL_CITY_STATS
+    params = []
+    if cities is not None:
+        sql += f" WHERE s.city_id IN ({SQL_CITY_IDS})"
+        params.append(json.dumps(list(cities), ensure_ascii=False))
+    sql += f" ORDER BY {column} IS NULL, {column} {'DESC' if descending else 'ASC'}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return get_connection().execute(sql, params).fetchall()
@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+
+import db
+import profiling
+
+# Сколько строк читать из курсора за раз: память ограничена размером пачки
+FETCH_SIZE = 5000
+
+CSV_HEADER = ("city", "year", "price", "description", "wiki_link")
+
+# Расширение файла -> формат
+FORMATS = {
+    ".txt": "txt",
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".csv": "csv",
+    ".parquet": "parquet",
+}
+
+
+class ExportResult:
+    def __init__(self):
+        self.records = 0
+        self.total = 0
+
+
+def format_for_path(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Неизвестный формат файла: {os.path.basename(path)}")
+    return fmt
+
+
+# Записи (город, год, цена, описание, ссылка) пачками по FETCH_SIZE
+def iter_record_batches(fetch_size=FETCH_SIZE):
+    cursor = db.iter_all_records()
+    try:
+        while True:
+            with profiling.span("export.fetch_batch"):
+                rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+# Тот же вид, что у str(list) в прежнем экспорте: [('Город', 2020, 100.0, '...', '...'), ...]
+def _write_txt(f, batches):
+    f.write("[")
+    first = True
+    for rows in batches:
+        text = ", ".join(map(repr, rows))
+        f.write(text if first else ", " + text)
+        first = False
+        yield len(rows)
+    f.write("]")
+
+
+def _write_json(f, batches):
+    f.write("[")
+    first = True
+    for rows in batches:
+        for row in rows:
+            f.write("\n  " if first else ",\n  ")
+            f.write(json.dumps(row, ensure_ascii=False))
+            first = False
+        yield len(rows)
+    f.write("\n]" if not first else "]")
+
+
+def _write_ndjson(f, batches):
+    for rows in batches:
+        f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        yield len(rows)
+
+
+def _write_csv(f, batches):
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    for rows in batches:
+        writer.writerows(rows)
+        yield len(rows)
+
+
+# Колоночный формат: каждая пачка записывается отдельной группой строк
+def _write_parquet(path, batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для экспорта в Parquet нужен пакет pyarrow")
+
+    schema = pa.schema([
+        ("city", pa.string()),
+        ("year", pa.int32()),
+        ("price", pa.float64()),
+        ("description", pa.string()),
+        ("wiki_link", pa.string()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema))
+            yield len(rows)
+
+
+TEXT_WRITERS = {
+    "txt": _write_txt,
+    "json": _write_json,
+    "ndjson": _write_ndjson,
+    "csv": _write_csv,
+}
+
+
+# Потоковая выгрузка всей базы. Файл пишется во временный и переименовывается в конце,
+# поэтому при ошибке или отмене (исключение из progress) старый файл не портится.
+# progress(записано, всего) вызывается после каждой пачки.
+def export_file(path, fmt=None, progress=None, fetch_size=FETCH_SIZE):
+    fmt = fmt or format_for_path(path)
+    result = ExportResult()
+    result.total = db.count_records()
+    tmp_path = path + ".part"
+    batches = iter_record_batches(fetch_size)
+
+    try:
+        with profiling.span(f"export.{fmt}"):
+            if fmt == "parquet":
+                _drain(_write_parquet(tmp_path, batches), result, progress)
+            else:
+                newline = "" if fmt == "csv" else None
+                with open(tmp_path, "w", encoding="utf-8", newline=newline) as f:
+                    _drain(TEXT_WRITERS[fmt](f, batches), result, progress)
+        os.replace(tmp_path, path)
+    except BaseException:
+        batches.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return result
+
+
+def _drain(written, result, progress):
+    for count in written:
+        result.records += count
+        if progress:
+            progress(result.records, result.total)
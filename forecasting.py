@@ -0,0 +1,398 @@
+from statistics import NormalDist
+
+import numpy as np
+
+# Уровень доверия интервала прогноза: оптимистичный и пессимистичный сценарии —
+# его верхняя и нижняя границы, рассчитанные по остаткам той же подгонки
+INTERVAL_LEVEL = 0.8
+# Горизонт прогноза: на сколько лет вперёд от последнего наблюдения города
+FORECAST_HORIZON = 1
+
+
+# Параметры модели Хольта (сглаживание уровня и наклона)
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.3
+# Устойчивая регрессия: порог функции Хьюбера (в масштабах MAD) и число итераций IRLS
+HUBER_K = 1.345
+ROBUST_ITERATIONS = 10
+ROBUST_TOLERANCE = 1e-4
+# MAD / 0.6745 — оценка стандартного отклонения для нормальных остатков
+MAD_SCALE = 0.6745
+
+
+# Квантиль t-распределения Стьюдента, векторно по числу степеней свободы.
+# Для 1 и 2 степеней — точные формулы, дальше — разложение Корниша — Фишера
+# (Abramowitz, Stegun 26.7.5), погрешность не больше 0.2% уже при трёх степенях.
+# Без степеней свободы (df < 1) оценить разброс нельзя — NaN.
+def t_quantile(p, df):
+    df = np.asarray(df, dtype=float)
+    z = NormalDist().inv_cdf(p)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = (z
+             + (z ** 3 + z) / 4 / df
+             + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96 / df ** 2
+             + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384 / df ** 3
+             + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160 / df ** 4)
+    t = np.where(df == 1, np.tan(np.pi * (p - 0.5)), t)
+    t = np.where(df == 2, (2 * p - 1) / np.sqrt(2 * p * (1 - p)), t)
+    return np.where(df >= 1, t, np.nan)
+
+
+# Общий интерфейс прогноза: predict(years) по городам и interval — границы прогноза
+# вокруг значений values на годах years. Одиночный прогноз хранит скаляры, пакетный — массивы по городам.
+class Forecast:
+    def predict(self, years):
+        raise NotImplementedError
+
+    # Значения модели на годах обучения (линия тренда на графике)
+    def fitted(self, years):
+        return self.predict(years)
+
+    def interval(self, years, values, level=INTERVAL_LEVEL):
+        raise NotImplementedError
+
+
+# Линейный тренд цены по году. Кроме коэффициентов хранит то, что нужно для интервала
+# прогноза МНК: оценку разброса остатков, число точек, средний год и сумму квадратов отклонений лет.
+class TrendForecast(Forecast):
+    def __init__(self, slope, intercept, scale, count, x_mean, sxx):
+        self.slope = np.asarray(slope, dtype=float)
+        self.intercept = np.asarray(intercept, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.count = np.asarray(count, dtype=float)
+        self.x_mean = np.asarray(x_mean, dtype=float)
+        self.sxx = np.asarray(sxx, dtype=float)
+
+    # Линейная часть модели и перевод в цены (у логлинейной модели — экспонента)
+    def _line(self, years):
+        return self.intercept[..., None] + self.slope[..., None] * np.asarray(years, dtype=float)
+
+    def _to_price(self, values):
+        return values
+
+    def _from_price(self, values):
+        return values
+
+    def predict(self, years):
+        return self._to_price(self._line(years))
+
+    # Интервал прогноза МНК: s * t * sqrt(1 + 1/n + (x - x̄)² / Sxx), df = n - 2
+    def interval(self, years, values, level=INTERVAL_LEVEL):
+        years = np.asarray(years, dtype=float)
+        t = t_quantile((1 + level) / 2, self.count - 2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spread = self.scale[..., None] * np.sqrt(
+                1 + 1 / self.count[..., None]
+                + (years - self.x_mean[..., None]) ** 2 / self.sxx[..., None])
+        margin = t[..., None] * spread
+        centre = self._from_price(np.asarray(values, dtype=float))
+        return self._to_price(centre - margin), self._to_price(centre + margin)
+
+    def __getitem__(self, index):
+        return type(self)(self.slope[index], self.intercept[index], self.scale[index],
+                          self.count[index], self.x_mean[index], self.sxx[index])
+
+    def __len__(self):
+        return len(self.slope)
+
+
+# Линейный тренд логарифма цены: постоянный среднегодовой темп роста (CAGR).
+# Интервал строится в логарифмах, поэтому он несимметричен в ценах.
+class LogTrendForecast(TrendForecast):
+    def _to_price(self, values):
+        return np.exp(values)
+
+    def _from_price(self, values):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.log(values)
+
+    @property
+    def growth(self):
+        return np.expm1(self.slope)
+
+
+# Модель Хольта: уровень и наклон на последний наблюдённый год,
+# smoothed — сглаженные уровни на годах обучения (NaN, где наблюдений нет),
+# scale и count — разброс и число ошибок прогноза на шаг вперёд
+class HoltForecast(Forecast):
+    def __init__(self, level, trend, last_year, smoothed, scale, count, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+        self.level = np.asarray(level, dtype=float)
+        self.trend = np.asarray(trend, dtype=float)
+        self.last_year = np.asarray(last_year, dtype=float)
+        self.smoothed = np.asarray(smoothed, dtype=float)
+        self.scale = np.asarray(scale, dtype=float)
+        self.count = np.asarray(count, dtype=float)
+        self.alpha = alpha
+        self.beta = beta
+
+    def predict(self, years):
+        years = np.asarray(years, dtype=float)
+        return self.level[..., None] + self.trend[..., None] * (years - self.last_year[..., None])
+
+    def fitted(self, years):
+        return self.smoothed
+
+    # Дисперсия ошибки на h шагов: s² (1 + Σ_{j<h} α² (1 + jβ)²); на годах обучения h = 1
+    def interval(self, years, values, level=INTERVAL_LEVEL):
+        steps = np.maximum(np.asarray(years, dtype=float) - self.last_year[..., None], 1) - 1
+        alpha, beta = self.alpha, self.beta
+        variance = 1 + alpha ** 2 * (steps + beta * steps * (steps + 1)
+                                     + beta ** 2 * steps * (steps + 1) * (2 * steps + 1) / 6)
+        t = t_quantile((1 + level) / 2, self.count)
+        margin = t[..., None] * self.scale[..., None] * np.sqrt(variance)
+        values = np.asarray(values, dtype=float)
+        return values - margin, values + margin
+
+    def __getitem__(self, index):
+        return HoltForecast(self.level[index], self.trend[index], self.last_year[index],
+                            self.smoothed[index], self.scale[index], self.count[index],
+                            self.alpha, self.beta)
+
+    def __len__(self):
+        return len(self.level)
+
+
+def _as_matrix(years, prices):
+    return np.asarray(years, dtype=float), np.atleast_2d(np.asarray(prices, dtype=float))
+
+
+# Взвешенный МНК в замкнутой форме для всех строк сразу; нулевой вес исключает точку.
+# Возвращает коэффициенты и средний год, сумму квадратов отклонений лет и остатки.
+def _weighted_lines(years, prices, weights):
+    observed = weights > 0
+    values = np.where(observed, prices, 0.0)
+    total = weights.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = (weights * years).sum(axis=1) / total
+        y_mean = (weights * values).sum(axis=1) / total
+        dx = np.where(observed, years - x_mean[:, None], 0.0)
+        dy = np.where(observed, values - y_mean[:, None], 0.0)
+        sxx = np.einsum("ij,ij->i", weights * dx, dx)
+        sxy = np.einsum("ij,ij->i", weights * dx, dy)
+
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    intercept = y_mean - slope * np.nan_to_num(x_mean)
+    residuals = np.where(observed, dy - slope[:, None] * dx, 0.0)
+    return slope, intercept, x_mean, sxx, residuals
+
+
+# Оценка разброса остатков МНК: s² = Σ r² / (n - 2); при n <= 2 — NaN
+def _residual_scale(residuals, count):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 2, np.sqrt(np.einsum("ij,ij->i", residuals, residuals) / (count - 2)), np.nan)
+
+
+def _fit_lines(forecast_class, years, prices):
+    observed = ~np.isnan(prices)
+    count = observed.sum(axis=1)
+    slope, intercept, x_mean, sxx, residuals = _weighted_lines(years, prices, observed.astype(float))
+    return forecast_class(slope, intercept, _residual_scale(residuals, count), count, x_mean, sxx)
+
+
+# МНК сразу для всех строк матрицы цен (города × годы).
+# Пропуски (NaN) не участвуют в подгонке; при одной точке наклон равен нулю.
+def fit_trends(years, prices):
+    years, prices = _as_matrix(years, prices)
+    return _fit_lines(TrendForecast, years, prices)
+
+
+# Логлинейная модель: МНК по логарифму цены (неположительные цены пропускаются)
+def fit_log_trends(years, prices):
+    years, prices = _as_matrix(years, prices)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_prices = np.log(np.where(prices > 0, prices, np.nan))
+    return _fit_lines(LogTrendForecast, years, log_prices)
+
+
+# Медиана каждой строки по наблюдённым значениям (быстрее np.nanmedian: одна сортировка)
+def _row_medians(values, observed):
+    count = observed.sum(axis=1)
+    ordered = np.sort(np.where(observed, values, np.inf), axis=1)
+    rows = np.arange(len(values))
+    lower = np.maximum(count - 1, 0) // 2
+    upper = np.minimum(count // 2, values.shape[1] - 1)
+    medians = (ordered[rows, lower] + ordered[rows, upper]) / 2
+    return np.where(count > 0, medians, np.nan)
+
+
+# Устойчивая регрессия Хьюбера методом IRLS: выбросы получают меньший вес.
+# Все города пересчитываются вместе; итерации прекращаются, когда веса перестают меняться.
+# Разброс для интервала — по MAD остатков, чтобы выбросы не раздували границы.
+def fit_robust_trends(years, prices):
+    years, prices = _as_matrix(years, prices)
+    observed = ~np.isnan(prices)
+    count = observed.sum(axis=1)
+    weights = observed.astype(float)
+    for _ in range(ROBUST_ITERATIONS):
+        slope, intercept, x_mean, sxx, residuals = _weighted_lines(years, prices, weights)
+        scale = _row_medians(np.abs(residuals), observed) / MAD_SCALE
+        # При нулевом масштабе (точки на прямой) вес остаётся единичным
+        with np.errstate(invalid="ignore", divide="ignore"):
+            u = np.abs(residuals) / (HUBER_K * scale[:, None])
+            new_weights = np.where(observed, np.where(u > 1, 1 / u, 1.0), 0.0)
+        converged = np.allclose(new_weights, weights, atol=ROBUST_TOLERANCE)
+        weights = new_weights
+        if converged:
+            break
+
+    slope, intercept, x_mean, sxx, residuals = _weighted_lines(years, prices, weights)
+    scale = np.where(count > 2, _row_medians(np.abs(residuals), observed) / MAD_SCALE, np.nan)
+    return TrendForecast(slope, intercept, scale, count, x_mean, sxx)
+
+
+# Двойное экспоненциальное сглаживание (Хольт) по годам, векторно по городам.
+# Пропущенные годы пропускаются, наклон считается на один год.
+# Ошибки прогноза на шаг вперёд копятся для оценки разброса.
+def fit_holt(years, prices, alpha=HOLT_ALPHA, beta=HOLT_BETA):
+    years, prices = _as_matrix(years, prices)
+    count = len(prices)
+    level = np.full(count, np.nan)
+    trend = np.zeros(count)
+    last_year = np.full(count, np.nan)
+    seen = np.zeros(count, dtype=int)
+    smoothed = np.full(prices.shape, np.nan)
+    squared_errors = np.zeros(count)
+
+    for column, (year, values) in enumerate(zip(years, prices.T)):
+        observed = ~np.isnan(values)
+        first = observed & (seen == 0)
+        # Вторая точка задаёт начальный наклон
+        second = observed & (seen == 1)
+        later = observed & (seen > 1)
+
+        level[first] = values[first]
+        step = year - last_year
+        trend[second] = (values[second] - level[second]) / step[second]
+        level[second] = values[second]
+
+        expected = level[later] + trend[later] * step[later]
+        squared_errors[later] += (values[later] - expected) ** 2
+        new_level = alpha * values[later] + (1 - alpha) * expected
+        trend[later] = beta * (new_level - level[later]) / step[later] + (1 - beta) * trend[later]
+        level[later] = new_level
+
+        last_year[observed] = year
+        seen += observed
+        smoothed[observed, column] = level[observed]
+
+    errors = np.maximum(seen - 2, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scale = np.where(errors > 0, np.sqrt(squared_errors / errors), np.nan)
+    return HoltForecast(level, trend, last_year, smoothed, scale, errors, alpha, beta)
+
+
+# Реестр моделей: имя -> пакетная подгонка fit(years, prices) по матрице города × годы
+MODELS = {
+    "linear": fit_trends,
+    "loglinear": fit_log_trends,
+    "holt": fit_holt,
+    "robust": fit_robust_trends,
+}
+DEFAULT_MODEL = "linear"
+
+
+def get_model(name):
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестная модель прогноза: {name}")
+
+
+# Подгонка одного города
+def fit_city(years, prices, model=DEFAULT_MODEL):
+    return get_model(model)(years, np.asarray(prices, dtype=float)[None, :])[0]
+
+
+# Строки (город, год, цена) -> список городов, общая сетка лет и матрица цен с NaN
+def pivot_prices(rows):
+    names = []
+    index = {}
+    city_ids = []
+    row_years = []
+    row_prices = []
+    for name, year, price in rows:
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(names)
+            names.append(name)
+        city_ids.append(i)
+        row_years.append(year)
+        row_prices.append(price)
+
+    years, columns = np.unique(np.asarray(row_years, dtype=int), return_inverse=True)
+    matrix = np.full((len(names), len(years)), np.nan)
+    matrix[np.asarray(city_ids, dtype=int), columns] = row_prices
+    return names, years, matrix
+
+
+# Индексы первого и последнего наблюдения каждой строки матрицы цен
+def observed_bounds(matrix):
+    observed = ~np.isnan(matrix)
+    first = observed.argmax(axis=1)
+    last = matrix.shape[1] - 1 - observed[:, ::-1].argmax(axis=1)
+    return first, last
+
+
+# Годы прогноза: horizon лет после последнего наблюдения (скаляр -> вектор, вектор городов -> матрица)
+def horizon_years(last_years, horizon):
+    return np.asarray(last_years)[..., None] + np.arange(1, horizon + 1)
+
+
+# Прогноз одного города по его истории (год, цена): данные для графика и карточек.
+# Линии тренда продолжаются на весь горизонт, итоговые значения — на его последний год.
+# Сценарии — границы интервала прогноза; на годах истории — разброс вокруг линии модели.
+def city_forecast(rows, horizon=FORECAST_HORIZON, model=DEFAULT_MODEL, level=INTERVAL_LEVEL):
+    years = np.array([row[0] for row in rows])
+    prices = np.array([row[1] for row in rows], dtype=float)
+    forecast = fit_city(years, prices, model)
+    forecast_years = horizon_years(years[-1], horizon)
+    curve_years = np.concatenate((years, forecast_years))
+    fitted = forecast.fitted(years)
+    predicted = forecast.predict(forecast_years)
+    fitted_lower, fitted_upper = forecast.interval(years, fitted, level)
+    lower, upper = forecast.interval(forecast_years, predicted, level)
+    return {
+        "model": model,
+        "level": level,
+        "years": years,
+        "prices": prices,
+        "curve_years": curve_years,
+        "trend": np.concatenate((fitted, predicted)),
+        "optimistic": np.concatenate((fitted_upper, upper)),
+        "pessimistic": np.concatenate((fitted_lower, lower)),
+        "forecast_years": forecast_years,
+        "forecast_prices": predicted,
+        "forecast_optimistic": upper,
+        "forecast_pessimistic": lower,
+        "forecast_year": int(forecast_years[-1]),
+        "predicted_price": float(predicted[-1]),
+        "optimistic_price": float(upper[-1]),
+        "pessimistic_price": float(lower[-1]),
+    }
+
+
+# Сравнение нескольких городов: строки (город, год, цена) одной выборки сводятся в матрицу,
+# модель подгоняется сразу для всех городов, прогноз — на horizon лет от последнего наблюдения каждого
+def compare_forecast(rows, horizon=FORECAST_HORIZON, model=DEFAULT_MODEL):
+    names, years, matrix = pivot_prices(rows)
+    forecast = get_model(model)(years, matrix)
+    first, last = observed_bounds(matrix)
+    cities = np.arange(len(names))
+    forecast_years = horizon_years(years[last], horizon)
+    predicted = forecast.predict(forecast_years)
+    last_prices = matrix[cities, last]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = predicted[:, -1] / last_prices - 1
+    return {
+        "model": model,
+        "names": names,
+        "years": years,
+        "prices": matrix,
+        "last_years": years[last],
+        "last_prices": last_prices,
+        "forecast_years": forecast_years,
+        "forecast_prices": predicted,
+        "forecast_year": int(forecast_years[:, -1].max()),
+        "change": change,
+    }
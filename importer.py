@@ -0,0 +1,625 @@
+import ast
+import codecs
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import db
+import profiling
+
+# Размер читаемого блока файла и размер пачки для executemany
+CHUNK_SIZE = 1 << 16
+BATCH_SIZE = 5000
+# Предельный размер одной записи в JSON-файле
+MAX_RECORD_SIZE = 1 << 20
+# Через сколько записей фиксировать транзакцию
+COMMIT_EVERY = 100000
+
+RECORD_LENGTH_ERROR = "Каждая запись должна содержать 5 элементов: город, год, цена, описание, ссылка"
+
+# Импорт нескольких файлов: расширения, которые берутся из папки
+IMPORT_EXTENSIONS = (".txt", ".json", ".ndjson", ".jsonl", ".csv")
+# Сколько пачек может ждать записи в очереди: ограничивает память, пока писатель занят
+QUEUE_BATCHES = 16
+# Как часто писатель проверяет, живы ли процессы разбора, с
+QUEUE_POLL_SECONDS = 0.5
+# Сколько сообщений об отклонённых записях хранить на файл (счётчик — по всем)
+MAX_REJECTED_MESSAGES = 100
+
+
+# Потоковое чтение файла с учётом прочитанных байт (для прогресса)
+class FileReader:
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+
+    def chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        with open(self.path, "rb") as f:
+            while True:
+                data = f.read(self.chunk_size)
+                self.bytes_read += len(data)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    yield text
+                if not data:
+                    break
+
+
+class ImportResult:
+    def __init__(self):
+        self.records = 0
+        self.cities = set()
+        # Итог сравнения с базой (только при diff=True): новые, изменённые и совпавшие цены
+        self.new = 0
+        self.updated = 0
+        self.unchanged = 0
+
+
+# Отклонённые записи файла: при импорте нескольких файлов неверная запись пропускается
+class RejectedRecords:
+    def __init__(self, limit=MAX_REJECTED_MESSAGES):
+        self.limit = limit
+        self.count = 0
+        self.messages = []
+
+    def add(self, message):
+        self.count += 1
+        if len(self.messages) < self.limit:
+            self.messages.append(message)
+
+
+# Запись с проверенными полями; неверная — ошибка или, если передан rejected, пропуск (None)
+def check_record(record, where, rejected=None):
+    error = record_error(record)
+    if error is None:
+        return tuple(record)
+    return _reject(f"{where}: {error}", rejected)
+
+
+def _reject(message, rejected):
+    if rejected is None:
+        raise ValueError(message)
+    rejected.add(message)
+    return None
+
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+# Элементы JSON-массива по одному: пары (место в файле, значение).
+# Между элементами ровно одна запятая, перед первым и после последнего запятой нет.
+def _iter_json_array(chunks, first):
+    decoder = json.JSONDecoder()
+    buf = first
+    pos = buf.index("[") + 1
+    eof = False
+    count = 0
+    # Ожидается значение (после "[" и после запятой); иначе — запятая или конец массива
+    expect_value = True
+    while True:
+        pos = JSON_WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            ch = buf[pos]
+            if ch == "]" and (count == 0 or not expect_value):
+                _check_json_tail(buf[pos + 1:], chunks)
+                return
+            if not expect_value:
+                if ch != ",":
+                    raise ValueError(f"Неверный формат JSON: пропущена запятая после записи {count}")
+                expect_value = True
+                pos += 1
+                continue
+            if ch in ",]":
+                place = f"после записи {count}" if count else "перед первой записью"
+                raise ValueError(f"Неверный формат JSON: лишняя запятая {place}")
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # Одна запись не может быть такой большой — это ошибка формата, а не обрезанный блок
+                if eof or len(buf) - pos > MAX_RECORD_SIZE:
+                    raise ValueError(f"Неверный формат JSON в записи {count + 1}: {e.msg}")
+                end = None
+            # Значение, упёршееся в конец буфера, могло быть обрезано
+            if end is not None and (end < len(buf) or eof):
+                count += 1
+                expect_value = False
+                yield f"Запись {count}", value
+                pos = end
+                continue
+        if eof:
+            raise ValueError("Неожиданный конец JSON-файла")
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+# После закрывающей скобки массива допускаются только пробелы
+def _check_json_tail(rest, chunks):
+    for text in itertools.chain((rest,), chunks):
+        stripped = text.strip()
+        if stripped:
+            raise ValueError(f"Лишние данные после JSON-массива: {_txt_preview(stripped)}")
+
+
+# Строки NDJSON: пары (место в файле, значение); строка с неверным JSON — ошибка или пропуск
+def _iter_ndjson(chunks, first, rejected):
+    for number, line in enumerate(_iter_lines(itertools.chain((first,), chunks)), 1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            _reject(f"Строка {number}: неверный JSON: {e.msg}", rejected)
+            continue
+        yield f"Строка {number}", value
+
+
+# JSON-массив записей или NDJSON (по одной записи в строке)
+def iter_json_records(reader, rejected=None):
+    chunks = reader.chunks()
+    # Для выбора формата нужна первая строка целиком (если она не длиннее записи)
+    first = ""
+    for chunk in chunks:
+        first += chunk
+        stripped = first.lstrip()
+        if "\n" in stripped or len(stripped) > MAX_RECORD_SIZE:
+            break
+    stripped = first.lstrip()
+    if not stripped:
+        return
+    if stripped[0] == "[" and not _looks_like_ndjson(first):
+        records = _iter_json_array(chunks, first)
+    else:
+        records = _iter_ndjson(chunks, first, rejected)
+    for where, record in records:
+        record = check_record(record, where, rejected)
+        if record is not None:
+            yield record
+
+
+def _looks_like_ndjson(text):
+    # В NDJSON первая строка — самостоятельная запись ["город", год, ...]
+    first_line = text.lstrip().split("\n", 1)[0]
+    try:
+        value = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(value, list) and bool(value) and not isinstance(value[0], (list, dict))
+
+
+# Текстовый файл: список кортежей в Python-формате [("город", год, цена, "описание", "ссылка"), ...].
+# Записи разбираются по одной регулярным выражением прямо из буфера чтения, без построения AST:
+# память ограничена блоком чтения и одной записью. Строка файла считается для сообщений об ошибках.
+TXT_STRING = r"""'[^'\\\n]*(?:\\.[^'\\\n]*)*'|"[^"\\\n]*(?:\\.[^"\\\n]*)*\""""
+# Числа по грамматике литералов Python: "_" только между цифрами, у целых нет ведущих нулей,
+# дробное число содержит точку или показатель степени
+TXT_DIGITS = r"[0-9]+(?:_[0-9]+)*"
+TXT_INTEGER = r"[-+]?(?:[1-9](?:_?[0-9])*|0+(?:_?0)*)"
+TXT_EXPONENT = rf"[eE][-+]?{TXT_DIGITS}"
+TXT_FLOAT = rf"[-+]?(?:(?:(?:{TXT_DIGITS})?\.{TXT_DIGITS}|{TXT_DIGITS}\.)(?:{TXT_EXPONENT})?|{TXT_DIGITS}{TXT_EXPONENT})"
+# Запись вместе с пробелами вокруг и запятой после неё; цена — целое (int) или дробное число (float)
+TXT_RECORD = re.compile(rf"""
+    \s*
+    ([(\[])\s*
+    ({TXT_STRING})\s*,\s*
+    ({TXT_INTEGER})\s*,\s*
+    (?:({TXT_INTEGER})(?![0-9_.eE])|({TXT_FLOAT}))\s*,\s*
+    ({TXT_STRING}|None)\s*,\s*
+    ({TXT_STRING}|None)\s*,?\s*
+    ([)\]])\s*(,)?
+""", re.VERBOSE)
+# Граница записи без проверки полей: отличает неверную запись от обрезанной концом блока
+TXT_TUPLE = re.compile(rf"""[(\[](?:{TXT_STRING}|[^'"()\[\]])*[)\]]""")
+# Пробелы и комментарии до конца строки (комментарий без перевода строки в буфере может быть обрезан)
+TXT_BLANK = re.compile(r"(?:\s+|#[^\n]*\n)*")
+TXT_BRACKETS = {"(": ")", "[": "]"}
+
+
+def _txt_string(token):
+    if token == "None":
+        return None
+    body = token[1:-1]
+    # Экранирование встречается редко: только тогда строка разбирается как литерал
+    return body if "\\" not in body else ast.literal_eval(token)
+
+
+# Проверка полей записи: текст ошибки или None
+def record_error(record):
+    if not isinstance(record, (list, tuple)) or len(record) != 5:
+        return RECORD_LENGTH_ERROR
+    city, year, price, description, link = record
+    if not isinstance(city, str) or not city:
+        return "город должен быть непустой строкой"
+    if not isinstance(year, int) or isinstance(year, bool):
+        return "год должен быть целым числом"
+    if not isinstance(price, (int, float)) or isinstance(price, bool):
+        return "цена должна быть числом"
+    if not (description is None or isinstance(description, str)):
+        return "описание должно быть строкой"
+    if not (link is None or isinstance(link, str)):
+        return "ссылка должна быть строкой"
+    return None
+
+
+def _txt_preview(text, limit=80):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+# Медленный путь для записи, не подошедшей под TXT_RECORD: литерал одной записи
+# (например, строки в тройных кавычках) принимается, если поля верны, иначе — ошибка с номером строки
+def _txt_fallback(text, line, rejected):
+    try:
+        record = ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return _reject(f"Строка {line}: неверная запись {_txt_preview(text)}", rejected)
+    where = f"Строка {line}"
+    if record_error(record) is not None:
+        where += f" ({_txt_preview(text)})"
+    return check_record(record, where, rejected)
+
+
+def iter_txt_records(reader, rejected=None):
+    chunks = reader.chunks()
+    buf = ""
+    pos = 0
+    line = 1
+    eof = False
+    opened = False
+    # Ожидается запись или конец списка (после "[" и после запятой); иначе — запятая или конец списка
+    expect_record = True
+    while True:
+        # Быстрый путь: запись в простом формате целиком в буфере
+        match = TXT_RECORD.match(buf, pos) if opened and expect_record else None
+        if match is not None:
+            bracket, city, year, price_int, price, description, link, close, comma = match.groups()
+            try:
+                record = (_txt_string(city), int(year),
+                          int(price_int) if price_int is not None else float(price),
+                          _txt_string(description), _txt_string(link))
+            except (ValueError, SyntaxError):
+                # Неверное экранирование или слишком длинное число — в медленный путь с номером строки
+                record = None
+            if record is not None and TXT_BRACKETS[bracket] == close and record[0]:
+                end = match.end()
+                line += buf.count("\n", pos, end)
+                pos = end
+                expect_record = comma is not None
+                yield record
+                continue
+
+        end = TXT_BLANK.match(buf, pos).end()
+        line += buf.count("\n", pos, end)
+        pos = end
+
+        if pos < len(buf):
+            ch = buf[pos]
+            if ch == "#":
+                # Комментарий в последней строке файла; иначе дочитываем его конец
+                if eof:
+                    pos = len(buf)
+                    continue
+            elif not opened:
+                if ch != "[":
+                    raise ValueError(f"Строка {line}: файл должен содержать список кортежей")
+                opened = True
+                pos += 1
+                continue
+            elif ch == "]":
+                _check_txt_tail(buf[pos + 1:], chunks, line)
+                return
+            elif ch == ",":
+                if expect_record:
+                    raise ValueError(f"Строка {line}: лишняя запятая в списке")
+                expect_record = True
+                pos += 1
+                continue
+            elif ch not in TXT_BRACKETS:
+                raise ValueError(f"Строка {line}: {RECORD_LENGTH_ERROR}")
+            elif not expect_record:
+                raise ValueError(f"Строка {line}: пропущена запятая между записями")
+            else:
+                # Запись целиком в буфере, но не в простом формате — разбираем отдельно
+                whole = TXT_TUPLE.match(buf, pos)
+                if whole is not None:
+                    record = _txt_fallback(whole.group(), line, rejected)
+                    end = whole.end()
+                    line += buf.count("\n", pos, end)
+                    pos = end
+                    expect_record = False
+                    if record is not None:
+                        yield record
+                    continue
+                if eof or len(buf) - pos > MAX_RECORD_SIZE:
+                    raise ValueError(f"Строка {line}: неверная или незакрытая запись: {_txt_preview(buf[pos:pos + 80])}")
+        elif eof:
+            if not opened:
+                raise ValueError("Файл должен содержать список кортежей")
+            raise ValueError(f"Строка {line}: неожиданный конец файла")
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+# После закрывающей скобки списка допускаются только пробелы и комментарии
+def _check_txt_tail(rest, chunks, line):
+    for number, text in enumerate(_iter_lines(itertools.chain((rest,), chunks)), line):
+        data = text.split("#", 1)[0].strip()
+        if data:
+            raise ValueError(f"Строка {number}: лишние данные после списка: {_txt_preview(data)}")
+
+
+# CSV как у экспорта: city,year,price,description,wiki_link; строка заголовка необязательна
+def _iter_lines(chunks):
+    tail = ""
+    for chunk in chunks:
+        lines = (tail + chunk).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if tail:
+        yield tail
+
+
+def _csv_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def iter_csv_records(reader, rejected=None):
+    rows = csv.reader(_iter_lines(reader.chunks()))
+    for row in rows:
+        if not row:
+            continue
+        where = f"Строка {rows.line_num}"
+        if len(row) != 5:
+            check_record(row, where, rejected)
+            continue
+        city, year, price, description, link = row
+        if rows.line_num == 1 and year == "year":
+            continue
+        # Неразобранное число остаётся строкой, и check_record отклоняет запись
+        try:
+            year = int(year)
+            price = _csv_number(price)
+        except ValueError:
+            pass
+        # Пустые поля экспорт пишет вместо NULL
+        record = check_record((city, year, price, description or None, link or None), where, rejected)
+        if record is not None:
+            yield record
+
+
+def iter_file_records(reader, rejected=None):
+    path = reader.path.lower()
+    if path.endswith(".txt"):
+        return iter_txt_records(reader, rejected)
+    if path.endswith(".csv"):
+        return iter_csv_records(reader, rejected)
+    return iter_json_records(reader, rejected)
+
+
+def _batched(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Запись пачек (итог, записи) в БД транзакциями ограниченного размера; итог — ImportResult,
+# в который добавляются счётчики пачки. diff=True — пишутся только новые и изменившиеся цены.
+# Пачки разбираются (или ждутся от процессов разбора) вне блокировки записи: она берётся
+# только на запись накопленных commit_every записей и коммит.
+def write_batches(batches, commit_every=COMMIT_EVERY, diff=False, progress=None):
+    batches = iter(batches)
+    while True:
+        pending = []
+        count = 0
+        # Время между пачками — чтение и разбор файла
+        parse_started = time.perf_counter()
+        for result, batch in batches:
+            profiling.record("import.parse_batch", (time.perf_counter() - parse_started) * 1000)
+            pending.append((result, batch))
+            count += len(batch)
+            # Прогресс чтения (и проверка отмены) — по каждой разобранной пачке
+            if progress:
+                progress(result)
+            if count >= commit_every:
+                break
+            parse_started = time.perf_counter()
+        _write_pending(pending, diff, progress)
+        if count < commit_every:
+            return
+
+
+def _write_pending(pending, diff, progress):
+    if not pending:
+        return
+    with db.transaction() as conn:
+        for result, batch in pending:
+            with profiling.span("import.write_batch"):
+                if diff:
+                    new, updated, unchanged = db.write_changed_records(conn, batch)
+                    result.new += new
+                    result.updated += updated
+                    result.unchanged += unchanged
+                else:
+                    db.write_records(conn, batch)
+            result.records += len(batch)
+            result.cities.update(record[0] for record in batch)
+            if progress:
+                progress(result)
+
+
+# Пакетная запись в БД: executemany пачками, транзакции ограниченного размера
+def import_records(records, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, progress=None, diff=False):
+    result = ImportResult()
+    write_batches(((result, batch) for batch in _batched(records, batch_size)),
+                  commit_every=commit_every, diff=diff, progress=progress)
+    return result
+
+
+def import_file(path, progress=None, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, diff=False):
+    reader = FileReader(path)
+
+    def report(result):
+        if progress:
+            progress(result.records, reader.bytes_read, reader.total_bytes)
+
+    with profiling.span("import.file"):
+        result = import_records(iter_file_records(reader), batch_size=batch_size,
+                                commit_every=commit_every, progress=report, diff=diff)
+    report(result)
+    return result
+
+
+class FileImportResult(ImportResult):
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        # Города, которые добавил в базу этот файл (город — только у первого добавившего файла)
+        self.new_cities = set()
+        self.rejected = RejectedRecords()
+        # Ошибка, прервавшая разбор файла (записи до неё уже загружены)
+        self.error = None
+        self.bytes_read = 0
+        self.total_bytes = os.path.getsize(path)
+
+
+# Файлы для импорта: папки раскрываются в файлы поддерживаемых форматов
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(entry.path for entry in os.scandir(path)
+                                if entry.is_file() and entry.name.lower().endswith(IMPORT_EXTENSIONS)))
+        else:
+            files.append(path)
+    if not files:
+        raise ValueError("Нет файлов для импорта")
+    return files
+
+
+# Очередь пачек рабочего процесса разбора (передаётся при запуске процесса)
+_batches = None
+
+
+def _init_parse_worker(batches):
+    global _batches
+    _batches = batches
+
+
+# Разбор и проверка одного файла в рабочем процессе. Пачки уходят писателю по мере разбора:
+# (номер файла, записи, прочитано байт), в конце — (номер файла, None, (отклонённые, ошибка))
+def parse_file(index, path, batch_size=BATCH_SIZE):
+    rejected = RejectedRecords()
+    error = None
+    batch = []
+    try:
+        reader = FileReader(path)
+        for record in iter_file_records(reader, rejected):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _batches.put((index, batch, reader.bytes_read))
+                batch = []
+        if batch:
+            _batches.put((index, batch, reader.bytes_read))
+    except Exception as e:
+        if batch:
+            _batches.put((index, batch, reader.bytes_read))
+        error = str(e)
+    _batches.put((index, None, (rejected, error)))
+
+
+# Пачки от процессов разбора вместе с итогом их файла, для write_batches.
+# Пачки пишутся в порядке получения, поэтому новый город достаётся файлу, первым его добавившему;
+# known — города, уже бывшие в базе или встреченные раньше.
+def _received_batches(batches, futures, results, known):
+    remaining = len(results)
+    while remaining:
+        try:
+            index, records, info = batches.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            # Процесс разбора мог аварийно завершиться, не прислав итог
+            for future in futures:
+                if future.done() and future.exception() is not None:
+                    raise future.exception()
+            continue
+        result = results[index]
+        if records is None:
+            result.rejected, result.error = info
+            result.bytes_read = result.total_bytes
+            remaining -= 1
+        else:
+            result.bytes_read = info
+            cities = {record[0] for record in records} - known
+            if cities:
+                result.new_cities |= cities
+                known |= cities
+            yield result, records
+
+
+# Очередь разбирается до завершения процессов, иначе они зависнут на заполненной очереди
+def _drain(batches, futures):
+    while not all(future.done() for future in futures):
+        try:
+            batches.get(timeout=QUEUE_POLL_SECONDS)
+        except queue.Empty:
+            pass
+
+
+# Импорт нескольких файлов (или папок): файлы разбираются и проверяются в процессах,
+# а записывает в базу только вызывающий поток — большими транзакциями, как import_records.
+# Неверные записи не прерывают импорт, а попадают в rejected своего файла.
+# progress(записей, прочитано байт, всего байт) — по всем файлам; diff — как у import_records.
+def import_files(paths, workers=None, progress=None, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY,
+                 diff=False):
+    files = collect_files(paths)
+    results = [FileImportResult(path) for path in files]
+    known = set(db.get_cities())
+    total_bytes = sum(result.total_bytes for result in results)
+
+    def report(result):
+        if progress:
+            progress(sum(r.records for r in results), sum(r.bytes_read for r in results), total_bytes)
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+
+    # spawn: соединения SQLite и Tk нельзя наследовать через fork
+    context = multiprocessing.get_context("spawn")
+    batches = context.Queue(maxsize=QUEUE_BATCHES)
+    with profiling.span("import.files"), ProcessPoolExecutor(
+            max_workers=workers, mp_context=context,
+            initializer=_init_parse_worker, initargs=(batches,)) as pool:
+        futures = [pool.submit(parse_file, i, path, batch_size) for i, path in enumerate(files)]
+        try:
+            write_batches(_received_batches(batches, futures, results, known),
+                          commit_every=commit_every, diff=diff, progress=report)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            _drain(batches, futures)
+            raise
+    return results
@@ -0,0 +1,261 @@
+# Замеры горячих путей: интервалы (span) по этапам действий пользователя, импорта и экспорта
+# складываются в гистограммы по имени. Модуль не зависит от Tk и numpy.
+#
+#   with profiling.span("forecast.sql"):
+#       rows = db.get_city_data(city)
+#
+# Сводку показывает панель отладки приложения (F12), её же можно сохранить в JSON.
+import bisect
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+
+# Границы корзин гистограммы в мс: от 10 мкс, каждая следующая вдвое больше (до ~80 с)
+BUCKET_BOUNDS = tuple(0.01 * 2 ** i for i in range(24))
+# Проверка отзывчивости цикла событий Tk: период и задержка, считающаяся зависанием
+STALL_CHECK_MS = 50
+STALL_THRESHOLD_MS = 200
+# Сколько последних зависаний хранить
+MAX_STALLS = 50
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, ms)] += 1
+
+    # Оценка перцентиля по корзинам: верхняя граница корзины, но не больше максимума
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        need = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= need:
+                return min(BUCKET_BOUNDS[i], self.max) if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "min_ms": self.min if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "buckets": {f"{bound:g}": count for bound, count in zip(BUCKET_BOUNDS + (float("inf"),), self.buckets)
+                        if count},
+        }
+
+
+class Span:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+# Гистограммы по именам интервалов (потокобезопасно) и список последних зависаний интерфейса.
+# Для зависаний запоминается самый долгий интервал главного потока с прошлой проверки.
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._main_thread = threading.main_thread().ident
+        self._slowest_main = None
+        self.stalls = []
+
+    def span(self, name):
+        return Span(self, name)
+
+    # suspect=False — замер не может считаться причиной зависания (собственные замеры монитора)
+    def record(self, name, ms, suspect=True):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(ms)
+            if suspect and threading.get_ident() == self._main_thread and (
+                    self._slowest_main is None or ms > self._slowest_main[1]):
+                self._slowest_main = (name, ms)
+
+    def take_slowest_main(self):
+        with self._lock:
+            slowest, self._slowest_main = self._slowest_main, None
+        return slowest
+
+    def add_stall(self, ms, culprit):
+        with self._lock:
+            self.stalls.append({"time": time.strftime("%H:%M:%S"), "ms": ms,
+                                "span": culprit[0] if culprit else None,
+                                "span_ms": culprit[1] if culprit else None})
+            del self.stalls[:-MAX_STALLS]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "spans": {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())},
+                "stalls": list(self.stalls),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._slowest_main = None
+            self.stalls.clear()
+
+
+# Захват cProfile по запросу. Профилировщик главного потока включается сразу,
+# фоновые задачи запускаются через call() под собственным профилировщиком потока;
+# при остановке статистика всех потоков объединяется.
+class Capture:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._main = None
+        self._profiles = []
+
+    @property
+    def active(self):
+        return self._main is not None
+
+    def start(self):
+        if self._main is not None:
+            return
+        self._profiles = []
+        self._main = cProfile.Profile()
+        self._main.enable()
+
+    # Возвращает pstats.Stats по всем потокам (None, если захват не шёл)
+    def stop(self):
+        if self._main is None:
+            return None
+        self._main.disable()
+        stats = pstats.Stats(self._main)
+        self._main = None
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for profile in profiles:
+            stats.add(profile)
+        return stats
+
+    def call(self, fn, *args, **kwargs):
+        if self._main is None:
+            return fn(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: профилировщик общий для всех потоков и уже включён
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+
+# Проверка цикла событий Tk: обработчик ставится на каждые interval мс,
+# опоздание вызова — время, на которое цикл был занят
+class StallMonitor:
+    def __init__(self, root, interval=STALL_CHECK_MS, threshold=STALL_THRESHOLD_MS):
+        self.root = root
+        self.interval = interval
+        self.threshold = threshold
+        self.expected = None
+        self.after_id = None
+
+    def start(self):
+        self.expected = time.perf_counter() + self.interval / 1000
+        self.after_id = self.root.after(self.interval, self._tick)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _tick(self):
+        lag = max(0.0, (time.perf_counter() - self.expected) * 1000)
+        culprit = _profiler.take_slowest_main()
+        # Сама задержка не должна попасть в виновники этого или следующего зависания
+        _profiler.record("tk.event_loop_lag", lag, suspect=False)
+        if lag >= self.threshold:
+            _profiler.record("tk.stall", lag, suspect=False)
+            _profiler.add_stall(lag, culprit)
+        self.start()
+
+
+_profiler = Profiler()
+_capture = Capture()
+
+
+def span(name):
+    return _profiler.span(name)
+
+
+def record(name, ms):
+    _profiler.record(name, ms)
+
+
+def snapshot():
+    return _profiler.snapshot()
+
+
+def reset():
+    _profiler.reset()
+
+
+def dump(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+
+
+def capture_active():
+    return _capture.active
+
+
+def start_capture():
+    _capture.start()
+
+
+# Остановка захвата: статистика сохраняется в path (формат pstats, если указан)
+# и возвращается текстом — top функций по суммарному времени
+def stop_capture(path=None, top=30):
+    stats = _capture.stop()
+    if stats is None:
+        return ""
+    if path:
+        stats.dump_stats(path)
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats(top)
+    return out.getvalue()
+
+
+def call(fn, *args, **kwargs):
+    return _capture.call(fn, *args, **kwargs)
@@ -0,0 +1,115 @@
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import db
+
+RENDER_FORMATS = ("png", "svg")
+RENDER_KINDS = ("forecast", "bar")
+RENDER_DPI = 100
+# Размер фигуры и отступ снизу под легенду: раскладка задаётся один раз
+# вместо bbox_inches="tight", который требует лишней отрисовки на каждый файл
+RENDER_FIGSIZE = {"forecast": (8, 6.5), "bar": (8, 5)}
+RENDER_BOTTOM = {"forecast": 0.33, "bar": 0.11}
+# Города передаются процессам пачками, чтобы не платить за пересылку по одному
+MAX_CHUNK_SIZE = 32
+CHUNKS_PER_WORKER = 4
+
+# Символы, недопустимые в именах файлов
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+# Шаблоны графиков рабочего процесса: создаются один раз и переиспользуются для всех городов
+_charts = {}
+
+
+# Очищенные названия могут совпасть ("A B" и "A_B", или отличаться только регистром),
+# поэтому к имени файла добавляется короткий хэш исходного названия
+def chart_filename(city, kind, fmt):
+    name = UNSAFE_FILENAME_CHARS.sub("_", city).strip("_") or "city"
+    digest = hashlib.sha1(city.encode("utf-8")).hexdigest()[:8]
+    return f"{name}_{digest}_{kind}.{fmt}"
+
+
+# Рабочий процесс открывает своё соединение с базой
+def _init_worker(db_path):
+    db.configure(db_path)
+
+
+def _chart(kind):
+    chart = _charts.get(kind)
+    if chart is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from charts import BarChart, ForecastChart
+
+        chart_class = ForecastChart if kind == "forecast" else BarChart
+        chart = _charts[kind] = chart_class(figsize=RENDER_FIGSIZE[kind])
+        chart.figure.subplots_adjust(bottom=RENDER_BOTTOM[kind])
+        # Холст Agg привязывается один раз, его рендерер переиспользуется между сохранениями
+        FigureCanvasAgg(chart.figure)
+    return chart
+
+
+def render_city(city, out_dir, fmt="png", kinds=RENDER_KINDS, horizon=1, model="linear",
+                dpi=RENDER_DPI):
+    from forecasting import city_forecast
+
+    rows = db.get_city_data(city)
+    if not rows:
+        return []
+    paths = []
+    for kind in kinds:
+        chart = _chart(kind)
+        if kind == "forecast":
+            chart.update(city, city_forecast(rows, horizon, model))
+        else:
+            chart.update(city, [row[0] for row in rows], [row[1] for row in rows])
+        path = os.path.join(out_dir, chart_filename(city, kind, fmt))
+        chart.figure.savefig(path, format=fmt, dpi=dpi, facecolor=chart.figure.get_facecolor())
+        paths.append(path)
+    return paths
+
+
+def render_chunk(cities, out_dir, fmt, kinds, horizon, model, dpi):
+    paths = []
+    for city in cities:
+        paths.extend(render_city(city, out_dir, fmt, kinds, horizon, model, dpi))
+    return len(cities), paths
+
+
+def chunk_size(count, workers):
+    return max(1, min(MAX_CHUNK_SIZE, math.ceil(count / (workers * CHUNKS_PER_WORKER))))
+
+
+# Графики для списка городов в нескольких процессах (matplotlib без GUI, Agg).
+# Процессы запускаются через spawn: соединения SQLite и Tk нельзя наследовать через fork.
+# progress(готово городов, всего) вызывается в главном процессе по мере готовности пачек.
+def render_all(cities, out_dir, fmt="png", kinds=RENDER_KINDS, horizon=1, model="linear",
+               workers=None, dpi=RENDER_DPI, progress=None):
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}")
+    unknown = set(kinds) - set(RENDER_KINDS)
+    if unknown:
+        raise ValueError(f"Неизвестный тип графика: {', '.join(sorted(unknown))}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    cities = list(cities)
+    workers = workers or os.cpu_count() or 1
+    size = chunk_size(len(cities), workers)
+    paths = []
+    done = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(os.path.abspath(db.DB_PATH),)) as pool:
+        futures = [pool.submit(render_chunk, cities[i:i + size], out_dir, fmt, tuple(kinds),
+                               horizon, model, dpi)
+                   for i in range(0, len(cities), size)]
+        for future in as_completed(futures):
+            count, chunk_paths = future.result()
+            paths.extend(chunk_paths)
+            done += count
+            if progress:
+                progress(done, len(cities))
+    return paths
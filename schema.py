@@ -0,0 +1,173 @@
+# Версионированная схема базы данных.
+# Версия хранится в PRAGMA user_version, каждая миграция выполняется в своей транзакции.
+
+SCHEMA_VERSION = 4
+
+CREATE_CITIES = """
+    CREATE TABLE IF NOT EXISTS cities (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT,
+        wiki_link TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+# Счётчик записей в базу: каждая транзакция, изменившая города, увеличивает его и присваивает
+# новое значение cities.version этих городов. Версия хранится в базе, поэтому запись из другого
+# процесса (cli import) тоже меняет ключи кэшей. Счётчик не убывает, и город, удалённый
+# и добавленный снова, получает версию, которой у него ещё не было.
+CREATE_DATA_GENERATION = """
+    CREATE TABLE IF NOT EXISTS data_generation (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        value INTEGER NOT NULL
+    )
+"""
+INSERT_DATA_GENERATION = "INSERT OR IGNORE INTO data_generation (id, value) VALUES (1, 0)"
+
+# Первичный ключ (city_id, year) без rowid — кластерный индекс для выборки по городу
+CREATE_PRICES = """
+    CREATE TABLE IF NOT EXISTS prices (
+        city_id INTEGER NOT NULL REFERENCES cities(id) ON DELETE CASCADE,
+        year INTEGER NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (city_id, year)
+    ) WITHOUT ROWID
+"""
+
+# Индекс по году: список лет в базе выбирается прыжками по индексу, без полного просмотра
+CREATE_PRICES_YEAR_INDEX = "CREATE INDEX IF NOT EXISTS prices_year ON prices (year)"
+
+# Сводка по городу: первое и последнее наблюдение, линейный тренд МНК (как forecasting.fit_trends),
+# среднегодовой темп роста и прогноз на год после последнего наблюдения.
+# Поддерживается записью в базу (db.refresh_city_stats), удаляется вместе с городом.
+CREATE_CITY_STATS = """
+    CREATE TABLE IF NOT EXISTS city_stats (
+        city_id INTEGER PRIMARY KEY REFERENCES cities(id) ON DELETE CASCADE,
+        observations INTEGER NOT NULL,
+        first_year INTEGER NOT NULL,
+        first_price REAL NOT NULL,
+        last_year INTEGER NOT NULL,
+        last_price REAL NOT NULL,
+        slope REAL NOT NULL,
+        intercept REAL NOT NULL,
+        cagr REAL,
+        forecast_price REAL NOT NULL
+    )
+"""
+
+# Пересчёт сводки по ценам городов, отобранных условием {where}.
+# Наклон считается по отклонениям от средних (два прохода), а не по суммам Σx², Σxy:
+# с годами порядка 2000 разность больших сумм теряет точность.
+INSERT_CITY_STATS = """
+    INSERT OR REPLACE INTO city_stats (city_id, observations, first_year, first_price,
+                                       last_year, last_price, slope, intercept, cagr, forecast_price)
+    WITH totals AS (
+        SELECT city_id, count(*) AS n, avg(year) AS x_mean, avg(price) AS y_mean,
+               min(year) AS first_year, max(year) AS last_year
+        FROM prices {where}
+        GROUP BY city_id
+    ), lines AS (
+        SELECT t.city_id, t.n, t.x_mean, t.y_mean, t.first_year, t.last_year,
+               sum((p.year - t.x_mean) * (p.year - t.x_mean)) AS sxx,
+               sum((p.year - t.x_mean) * (p.price - t.y_mean)) AS sxy
+        FROM totals AS t JOIN prices AS p ON p.city_id = t.city_id
+        GROUP BY t.city_id
+    ), trends AS (
+        SELECT *, CASE WHEN sxx > 0 THEN sxy / sxx ELSE 0.0 END AS slope FROM lines
+    )
+    SELECT l.city_id, l.n, l.first_year, f.price, l.last_year, e.price, l.slope,
+           l.y_mean - l.slope * l.x_mean,
+           growth_rate(f.price, e.price, l.last_year - l.first_year),
+           l.y_mean + l.slope * (l.last_year + 1 - l.x_mean)
+    FROM trends AS l
+    JOIN prices AS f ON f.city_id = l.city_id AND f.year = l.first_year
+    JOIN prices AS e ON e.city_id = l.city_id AND e.year = l.last_year
+"""
+
+
+# Среднегодовой темп роста между первым и последним наблюдением (функция SQL growth_rate,
+# регистрируется на каждом соединении: встроенные математические функции есть не во всех сборках SQLite)
+def growth_rate(first_price, last_price, years):
+    if years <= 0 or first_price <= 0 or last_price <= 0:
+        return None
+    return (last_price / first_price) ** (1 / years) - 1
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _table_columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+# Версия 1: таблица cities и компактная prices(city_id, year, price).
+# Переносит данные из обеих старых схем: (city, year) PRIMARY KEY и id AUTOINCREMENT.
+def _migrate_v1(conn):
+    legacy = "city" in _table_columns(conn, "prices")
+    if legacy:
+        conn.execute("ALTER TABLE prices RENAME TO prices_legacy")
+
+    conn.execute(CREATE_CITIES)
+    conn.execute(CREATE_PRICES)
+
+    if legacy:
+        # Описание и ссылка берутся из последней записи города — так же, как при импорте
+        # (db.SQL_UPSERT_CITY), чтобы перенесённая и заново загруженная база совпадали
+        conn.execute("""
+            INSERT INTO cities (name, description, wiki_link)
+            SELECT city, description, wiki_link
+            FROM (SELECT city, description, wiki_link, MAX(rowid)
+                  FROM prices_legacy WHERE city IS NOT NULL GROUP BY city)
+            ORDER BY city
+        """)
+        # В старой схеме с AUTOINCREMENT возможны дубли (город, год) — побеждает последняя запись
+        conn.execute("""
+            INSERT OR REPLACE INTO prices (city_id, year, price)
+            SELECT c.id, l.year, l.average_price
+            FROM prices_legacy AS l JOIN cities AS c ON c.name = l.city
+            WHERE l.year IS NOT NULL AND l.average_price IS NOT NULL
+            ORDER BY l.rowid
+        """)
+        conn.execute("DROP TABLE prices_legacy")
+
+
+# Версия 2: индекс prices(year)
+def _migrate_v2(conn):
+    conn.execute(CREATE_PRICES_YEAR_INDEX)
+
+
+# Версия 3: сводка по городам, заполняется по уже загруженным ценам
+def _migrate_v3(conn):
+    conn.execute(CREATE_CITY_STATS)
+    conn.execute(INSERT_CITY_STATS.format(where=""))
+
+
+# Версия 4: версии данных городов для кэшей
+def _migrate_v4(conn):
+    if "version" not in _table_columns(conn, "cities"):
+        conn.execute("ALTER TABLE cities ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    conn.execute(CREATE_DATA_GENERATION)
+    conn.execute(INSERT_DATA_GENERATION)
+
+
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+]
+
+
+def migrate(pool):
+    conn = pool.connection()
+    for version, migration in MIGRATIONS:
+        if get_version(conn) >= version:
+            continue
+        with pool.transaction() as conn:
+            # Повторная проверка под блокировкой записи
+            if get_version(conn) >= version:
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
@@ -0,0 +1,75 @@
+import bisect
+from collections import Counter
+
+# Минимальная доля общих триграмм для нечёткого совпадения
+FUZZY_THRESHOLD = 0.5
+# Нечёткие совпадения добавляются, только если точных мало
+FUZZY_MIN_RESULTS = 10
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+# Поисковый индекс по названиям городов: отсортированные ключи в нижнем регистре
+# для поиска по префиксу (bisect) и триграммы для поиска подстроки и нечёткого поиска
+class CityIndex:
+    def __init__(self, names):
+        pairs = sorted((name.lower(), name) for name in names)
+        self.keys = [key for key, _ in pairs]
+        self.names = [name for _, name in pairs]
+        self._postings = {}
+        for pos, key in enumerate(self.keys):
+            for gram in trigrams(f" {key} "):
+                self._postings.setdefault(gram, []).append(pos)
+        self._last_term = None
+        self._last_matches = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def prefix(self, term):
+        lo = bisect.bisect_left(self.keys, term)
+        hi = bisect.bisect_left(self.keys, term + "\U0010ffff", lo)
+        return range(lo, hi)
+
+    def _candidates(self, term):
+        # Уточнение предыдущего запроса: подходят только его совпадения
+        if self._last_term is not None and term.startswith(self._last_term):
+            return self._last_matches
+        if len(term) < 3:
+            return range(len(self.keys))
+        postings = sorted((self._postings.get(gram, ()) for gram in trigrams(term)), key=len)
+        candidates = set(postings[0])
+        for positions in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(positions)
+        return sorted(candidates)
+
+    def _fuzzy(self, term, exclude):
+        grams = trigrams(f" {term} ")
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._postings.get(gram, ()))
+        need = FUZZY_THRESHOLD * len(grams)
+        hits = sorted((-count, pos) for pos, count in counts.items()
+                      if count >= need and pos not in exclude)
+        return [pos for _, pos in hits]
+
+    # Сначала совпадения по началу названия, затем по подстроке, затем нечёткие
+    def search(self, term):
+        term = term.lower()
+        if not term:
+            self._last_term = None
+            return list(self.names)
+
+        matches = [pos for pos in self._candidates(term) if term in self.keys[pos]]
+        self._last_term, self._last_matches = term, matches
+
+        prefix = self.prefix(term)
+        ordered = list(prefix)
+        ordered += [pos for pos in matches if pos not in prefix]
+        if len(matches) < FUZZY_MIN_RESULTS and len(term) >= 3:
+            ordered += self._fuzzy(term, set(matches))
+        return [self.names[pos] for pos in ordered]
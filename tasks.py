@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+# Флаг отмены: задача проверяет его между этапами работы
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+# Время ожидания в очереди пула показывает, что все потоки заняты
+def _run_task(fn, token, submitted, *args):
+    profiling.record("task.queue_wait", (time.perf_counter() - submitted) * 1000)
+    return profiling.call(fn, token, *args)
+
+
+# Фоновые задачи в пуле потоков. Tk не потокобезопасен, поэтому результаты
+# складываются в очередь, которую главный поток разбирает через root.after.
+class TaskRunner:
+    def __init__(self, root, max_workers=2, poll_interval=15, name="task"):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._results = queue.SimpleQueue()
+        self._latest = {}
+        self._pending = 0
+        self._poll_id = None
+
+    # fn вызывается как fn(token, *args); задача с тем же key отменяет предыдущую
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        token = CancelToken()
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = token
+
+        future = self.executor.submit(_run_task, fn, token, time.perf_counter(), *args)
+        future.add_done_callback(
+            lambda f: self._results.put((key, token, f, on_done, on_error)))
+        self._pending += 1
+        self._schedule_poll()
+        return token
+
+    def cancel(self, key):
+        token = self._latest.pop(key, None)
+        if token is not None:
+            token.cancel()
+
+    def _schedule_poll(self):
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                key, token, future, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if key is not None and self._latest.get(key) is token:
+                del self._latest[key]
+            # Результат устаревшей задачи просто отбрасываем
+            if token.cancelled:
+                continue
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    on_done(future.result())
+            elif not isinstance(error, TaskCancelled) and on_error:
+                on_error(error)
+        if self._pending > 0:
+            self._schedule_poll()
+
+    def shutdown(self):
+        for token in self._latest.values():
+            token.cancel()
+        self._latest.clear()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+import unittest
+
+import db
+import importer
+
+
+class ImportFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db.configure(os.path.join(self.tmp.name, "test.db"))
+        db.create_database()
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    # Файл меньше одного блока чтения: строки NDJSON разбираются по одной
+    def test_small_ndjson(self):
+        records = [["Казань", 2020, 100.5, "описание", None], ["Казань", 2021, 110.0, "описание", None],
+                   ["Тула", 2020, 50.0, None, "https://example.org"]]
+        path = self.write("small.ndjson", "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+
+        result = importer.import_file(path)
+
+        self.assertEqual(result.records, 3)
+        self.assertEqual(result.cities, {"Казань", "Тула"})
+        self.assertEqual(db.get_city_data("Казань"), [(2020, 100.5), (2021, 110.0)])
+
+    # Между кортежами TXT ровно одна запятая, комментарии пропускаются
+    def test_txt_separators(self):
+        path = self.write("ok.txt", '# цены\n[("Тула", 2020, 50, None, None),  # первая\n ("Тула", 2021, 55.5, None, None),]\n')
+        self.assertEqual(importer.import_file(path).records, 2)
+
+        for text, message in (('[("Тула", 2020, 50, None, None)\n ("Тула", 2021, 55, None, None)]', "Строка 2: пропущена запятая"),
+                              ('[("Тула", 2020, 50, None, None),,\n]', "Строка 1: лишняя запятая")):
+            with self.subTest(text=text), self.assertRaisesRegex(ValueError, message):
+                importer.import_file(self.write("bad.txt", text))
+
+    # Между элементами JSON-массива ровно одна запятая
+    def test_json_array_separators(self):
+        for text, message in (('[["Тула", 2020, 50, null, null] ["Тула", 2021, 55, null, null]]', "пропущена запятая"),
+                              ('[,["Тула", 2020, 50, null, null]]', "лишняя запятая перед первой записью"),
+                              ('[["Тула", 2020, 50, null, null],,["Тула", 2021, 55, null, null]]', "лишняя запятая")):
+            with self.subTest(text=text), self.assertRaisesRegex(ValueError, message):
+                importer.import_file(self.write("bad.json", text))
+
+    # Строка NDJSON с неверным JSON при импорте нескольких файлов отклоняется с номером строки
+    def test_ndjson_bad_line_rejected(self):
+        path = self.write("bad.ndjson", '["Тула", 2020, 50, null, null]\n{oops\n["Тула", 2021, 55, null, null]\n')
+
+        result, = importer.import_files([path], workers=1)
+
+        self.assertIsNone(result.error)
+        self.assertEqual(result.records, 2)
+        self.assertEqual(result.rejected.count, 1)
+        self.assertTrue(result.rejected.messages[0].startswith("Строка 2: неверный JSON"))
+
+    # После закрывающей скобки JSON-массива допускаются только пробелы
+    def test_json_array_trailing_data(self):
+        path = self.write("tail.json", json.dumps([["Тула", 2020, 50.0, None, None]]) + "\n  ] {}")
+
+        with self.assertRaisesRegex(ValueError, "Лишние данные после JSON-массива"):
+            importer.import_file(path)
+
+    # Повторный импорт с поиском изменений обновляет описание и ссылку города
+    def test_diff_reimport_updates_city_info(self):
+        first = self.write("first.ndjson", json.dumps(["Тула", 2020, 50.0, "старое", None]) + "\n")
+        second = self.write("second.ndjson", json.dumps(["Тула", 2020, 50.0, "новое", "https://example.org"]) + "\n")
+        importer.import_file(first, diff=True)
+        version = db.data_version("Тула")
+
+        importer.import_file(second, diff=True)
+
+        self.assertEqual(db.get_city_info("Тула"), ("новое", "https://example.org"))
+        self.assertNotEqual(db.data_version("Тула"), version)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import db
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "legacy.db")
+
+    def tearDown(self):
+        db.close()
+        self.tmp.cleanup()
+
+    # Описание и ссылка города после переноса — из последней записи, как при импорте
+    def test_legacy_city_info_from_last_record(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""
+            CREATE TABLE prices (id INTEGER PRIMARY KEY AUTOINCREMENT, city TEXT, year INTEGER,
+                                 average_price REAL, description TEXT, wiki_link TEXT)
+        """)
+        conn.executemany("INSERT INTO prices (city, year, average_price, description, wiki_link) VALUES (?, ?, ?, ?, ?)",
+                         [("Тула", 2020, 50.0, "старое", None), ("Тула", 2021, 55.0, "новое", "https://example.org")])
+        conn.commit()
+        conn.close()
+
+        db.configure(self.path)
+        db.create_database()
+
+        self.assertEqual(db.get_city_info("Тула"), ("новое", "https://example.org"))
+        self.assertEqual(db.get_city_data("Тула"), [(2020, 50.0), (2021, 55.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
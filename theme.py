@@ -0,0 +1,26 @@
+# Цветовая палитра
+class SmoothTheme:
+    def __init__(self):
+        self.colors = {
+            "bg": "#2a2a2e",
+            "panel": "#3a3a3f",
+            "accent": "#5a7bb5",
+            "text": "#e0e0e0",
+            "text_secondary": "#b0b0b0",
+            "entry_bg": "#4a4a4f",
+            "border": "#5a5a5f",
+            "graph_bg": "#2a2a2e",
+            "graph_grid": "#4a4a4f",
+            "button": "#4a4a4f",
+            "button_hover": "#5a5a5f",
+            "danger": "#9b4a4a",
+            "success": "#4a9b6a",
+            "highlight": "#3a4a6a",
+            "tooltip_bg": "#3a3a3f",
+            "tooltip_text": "#e0e0e0",
+            "card_bg": "#3a3a3f",
+            "card_border": "#5a5a5f"
+        }
+
+
+theme = SmoothTheme()